@@ -0,0 +1,169 @@
+"""
+Micro-benchmark of the JobPosting (de)serialization against the model of the baseline commit 067dfab, copied
+verbatim. It set the fields through a __setattr__ loop and went through a new TypeSerializer / TypeDeserializer
+for every attribute. It does not know the fields added since, e.g. UploadedDatetime, which it skips.
+
+Usage:
+    python scripts/benchmark_job_posting.py            # 100k items
+    python scripts/benchmark_job_posting.py --items 10000
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+os.environ.setdefault('JOB_POSTING_TABLE', 'placeholder')
+
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer  # noqa: E402
+
+from models.job_posting import JobPosting  # noqa: E402
+
+
+class BaselineJobPosting():
+    """ JobPosting of the baseline commit 067dfab, verbatim """
+    id: str
+    external_id: str
+    url: str
+    origin_url: str
+    source: str
+    title: str
+    # company_id: str
+    company_name: str
+    location: str
+    job_description: str
+    posted_datetime: datetime
+    created_datetime: datetime
+    updated_datetime: datetime
+
+    def __init__(self, **kwargs):
+        for k, v in kwargs.items():
+            self.__setattr__(k, v)
+
+    def to_dynamo_object(self) -> dict:
+        serializer = TypeSerializer()
+        ddb_item = {
+            'Id': serializer.serialize(self.id)
+            }
+
+        if hasattr(self, 'external_id') and self.external_id:
+            ddb_item['ExternalId'] = serializer.serialize(self.external_id)
+
+        if hasattr(self, 'url') and self.url:
+            ddb_item['Url'] = serializer.serialize(self.url)
+
+        if hasattr(self, 'origin_url') and self.origin_url:
+            ddb_item['OriginUrl'] = serializer.serialize(self.origin_url)
+
+        if hasattr(self, 'source') and self.source:
+            ddb_item['Source'] = serializer.serialize(self.source)
+
+        if hasattr(self, 'title') and self.title:
+            ddb_item['Title'] = serializer.serialize(self.title)
+        
+        if hasattr(self, 'company_name') and self.company_name:
+            ddb_item['company_name'] = serializer.serialize(self.company_name)
+
+        if hasattr(self, 'location') and self.location:
+            ddb_item['LocationString'] = serializer.serialize(self.location)
+
+        if hasattr(self, 'job_description') and self.job_description:
+            ddb_item['JobDescription'] = serializer.serialize(self.job_description)
+
+        if hasattr(self, 'posted_datetime') and self.posted_datetime:
+            ddb_item['PostedDatetime'] = serializer.serialize(self.posted_datetime.isoformat())
+
+        if hasattr(self, 'created_datetime') and self.created_datetime:
+            ddb_item['CreatedDatetime'] = serializer.serialize(self.created_datetime.isoformat())
+
+        if hasattr(self, 'updated_datetime') and self.updated_datetime:
+            ddb_item['UpdatedDatetime'] = serializer.serialize(self.updated_datetime.isoformat())
+
+        return ddb_item
+
+
+    @classmethod
+    def from_dynamo_object(cls, dynamo_object: dict) -> BaselineJobPosting:
+        deserializer = TypeDeserializer()
+
+        kwargs = {
+            'id': deserializer.deserialize(dynamo_object.get('Id'))
+        }
+
+        kwargs['external_id'] = deserializer.deserialize(dynamo_object.get('ExternalId', {'S': ''}))
+        kwargs['url'] = deserializer.deserialize(dynamo_object.get('Url', {'S': ''}))
+        kwargs['origin_url'] = deserializer.deserialize(dynamo_object.get('OriginUrl', {'S': ''}))
+        kwargs['source'] = deserializer.deserialize(dynamo_object.get('Source', {'S': ''}))
+        kwargs['title'] = deserializer.deserialize(dynamo_object.get('Title', {'S': ''}))
+        kwargs['company_name'] = deserializer.deserialize(dynamo_object.get('CompanyName', {'S': ''}))
+        kwargs['location'] = deserializer.deserialize(dynamo_object.get('LocationString', {'S': ''}))
+        kwargs['job_description'] = deserializer.deserialize(dynamo_object.get('JobDescription', {'S': ''}))
+        kwargs['posted_datetime'] = datetime.fromisoformat(deserializer.deserialize(dynamo_object.get('PostedDatetime', {'S': '1970-01-01T00:00:00.000000'})))
+        kwargs['created_datetime'] = datetime.fromisoformat(deserializer.deserialize(dynamo_object.get('CreatedDatetime', {'S': '1970-01-01T00:00:00.000000'})))
+        kwargs['updated_datetime'] = datetime.fromisoformat(deserializer.deserialize(dynamo_object.get('UpdatedDatetime', {'S': '1970-01-01T00:00:00.000000'})))
+
+        return cls(**kwargs)
+
+
+def _build_items(count: int) -> list[dict]:
+    now = datetime.now().isoformat()
+    return [
+        {
+            'Id': {'S': f'00000000-0000-0000-0000-{i:012d}'},
+            'ExternalId': {'S': f'{i:016x}'},
+            'Url': {'S': f'https://ca.indeed.com/viewjob?jk={i:016x}'},
+            'OriginUrl': {'S': f'https://ca.indeed.com/rc/clk?jk={i:016x}&vjs=3'},
+            'Source': {'S': 'ca.indeed.com'},
+            'Title': {'S': 'Data Analyst'},
+            'CompanyName': {'S': 'Tofino'},
+            'LocationString': {'S': 'Vancouver, BC'},
+            'JobDescription': {'S': 'Analyze data. ' * 100},
+            'PostedDatetime': {'S': now},
+            'CreatedDatetime': {'S': now},
+            'UpdatedDatetime': {'S': now},
+            'UploadedDatetime': {'S': now},
+        }
+        for i in range(count)
+    ]
+
+
+def _benchmark(model, items: list[dict]) -> dict:
+    start = time.perf_counter()
+    job_postings = [model.from_dynamo_object(x) for x in items]
+    load_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for job_posting in job_postings:
+        job_posting.to_dynamo_object()
+    dump_seconds = time.perf_counter() - start
+
+    del job_postings
+    tracemalloc.start()
+    job_postings = [model.from_dynamo_object(x) for x in items]
+    memory_bytes, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del job_postings
+
+    return {'load': load_seconds, 'dump': dump_seconds, 'memory': memory_bytes}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Micro-benchmark of the JobPosting (de)serialization')
+    parser.add_argument('--items', type=int, default=100_000)
+    args = parser.parse_args()
+
+    items = _build_items(args.items)
+    baseline = _benchmark(BaselineJobPosting, items)
+    current = _benchmark(JobPosting, items)
+
+    print(f'{args.items} items          baseline     current   speedup')
+    for key, unit, scale in [('load', 's', 1), ('dump', 's', 1), ('memory', 'MB', 1 / 2 ** 20)]:
+        print(f'{key:<20} {baseline[key] * scale:8.2f}{unit:<2} {current[key] * scale:8.2f}{unit:<2} {baseline[key] / current[key]:6.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+"""
+Import time of the Lambda handlers, measured with `python -X importtime` in a fresh interpreter per handler.
+
+The handlers are read from template.yaml, and the modules are imported from src/ as on Lambda, with the
+literal environment variables set for them in template.yaml.
+
+Usage:
+    python scripts/profile_imports.py              # import time of every handler
+    python scripts/profile_imports.py --top 15     # and the slowest modules imported by each handler
+    python scripts/profile_imports.py --json
+    python scripts/profile_imports.py --budget-ms 1000    # fails when a handler takes longer to import
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+
+_ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_SRC_DIR = os.path.join(_ROOT_DIR, 'src')
+_TEMPLATE_PATH = os.path.join(_ROOT_DIR, 'template.yaml')
+
+# Read by the modules at import time, set by template.yaml on Lambda with references to the resources
+_PLACEHOLDER_ENV = {
+    'AWS_DEFAULT_REGION': 'us-west-2',
+    'INDEED_JOB_POSTING_S3_BUCKET': 'placeholder',
+    'CRAWLER_PROXY_TABLE': 'placeholder',
+    'CRAWL_RATE_LIMIT_TABLE': 'placeholder',
+    'JOB_POSTING_TABLE': 'placeholder',
+    'JOB_POSTING_EXTERNAL_ID_TABLE': 'placeholder',
+    'SEARCH_WATERMARK_TABLE': 'placeholder',
+    'STATE_MACHINE_EXECUTION_NOTIFICATION_TOPIC': 'placeholder',
+}
+
+# A resource of template.yaml, up to the next one
+_TEMPLATE_RESOURCE = re.compile(r'^  \w+:\n(?:(?!  \w).*\n?)*', flags=re.MULTILINE)
+_HANDLER = re.compile(r'^\s+Handler:\s*(\S+)\s*$', flags=re.MULTILINE)
+# Environment variables with a literal value, e.g. INDEED_DOWNLOADER_PARSE: 'true'
+_LITERAL_VARIABLE = re.compile(r"^\s+([A-Z][A-Z0-9_]*):\s*'([^']*)'", flags=re.MULTILINE)
+
+# "import time: self [us] | cumulative | imported package"
+_IMPORT_TIME_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)$')
+
+
+def list_handler_modules() -> list[str]:
+    with open(_TEMPLATE_PATH) as f:
+        handlers = _HANDLER.findall(f.read())
+    return sorted({handler.rsplit('.', 1)[0] for handler in handlers})
+
+
+def get_handler_environment(module: str) -> dict[str, str]:
+    """
+    Returns the literal environment variables of the functions whose handler is in the module.
+    A module shared by several functions gets the variables of all of them, e.g. the downloader imports
+    the parser as soon as one of its functions parses the pages.
+    """
+    with open(_TEMPLATE_PATH) as f:
+        template = f.read()
+
+    env = {}
+    for resource in _TEMPLATE_RESOURCE.finditer(template):
+        handler = _HANDLER.search(resource.group(0))
+        if handler and handler.group(1).rsplit('.', 1)[0] == module:
+            env.update(_LITERAL_VARIABLE.findall(resource.group(0)))
+    return env
+
+
+def profile_import(module: str) -> list[dict]:
+    """
+    Returns the modules imported by importing the module, with their self and cumulative import time in microseconds
+    """
+    env = {**_PLACEHOLDER_ENV, **os.environ, **get_handler_environment(module)}
+    completed = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=_SRC_DIR,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+        check=False
+    )
+    if completed.returncode:
+        raise RuntimeError(f'Importing {module} failed:\n{completed.stderr}')
+
+    imports = []
+    for line in completed.stderr.splitlines():
+        match = _IMPORT_TIME_LINE.match(line)
+        if match:
+            imports.append({
+                'module': match.group(4),
+                'self_us': int(match.group(1)),
+                'cumulative_us': int(match.group(2)),
+                'depth': len(match.group(3)) // 2,
+            })
+    return imports
+
+
+def measure_import_time(module: str) -> int:
+    """
+    Returns the import time of the module in microseconds
+    """
+    for imported in profile_import(module):
+        if imported['module'] == module:
+            return imported['cumulative_us']
+    raise RuntimeError(f'{module} was not imported')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Import time of the Lambda handlers')
+    parser.add_argument('--top', type=int, default=0, help='also list the N slowest modules imported by each handler')
+    parser.add_argument('--json', action='store_true', help='print {module: import time in milliseconds}')
+    parser.add_argument('--budget-ms', type=float, help='exit with 1 when a handler takes longer to import, e.g. on a quiet machine')
+    args = parser.parse_args()
+
+    results = {}
+    for module in list_handler_modules():
+        imports = profile_import(module)
+        results[module] = next(x['cumulative_us'] for x in imports if x['module'] == module) / 1000
+
+        if args.top and not args.json:
+            print(f'{module}: {results[module]:.1f} ms')
+            for imported in sorted(imports, key=lambda x: x['self_us'], reverse=True)[:args.top]:
+                print(f'    {imported["self_us"] / 1000:8.1f} ms self {imported["cumulative_us"] / 1000:8.1f} ms cumulative  {imported["module"]}')
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    elif not args.top:
+        for module, millis in results.items():
+            print(f'{millis:8.1f} ms  {module}')
+
+    if args.budget_ms is not None:
+        over_budget = [module for module, millis in results.items() if millis > args.budget_ms]
+        if over_budget:
+            print(f'Over the budget of {args.budget_ms:.0f} ms: {", ".join(over_budget)}', file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
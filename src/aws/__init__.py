@@ -1,9 +1,14 @@
 """ AWS clients """
 
-from .lambda_function import Lambda
-from .s3 import S3
-from .secret_manager import SecretManager
-from .sns import SNS
+import importlib
+
+# The modules are imported on first access (PEP 562), so that importing one client does not import the others
+_MODULES = {
+    'Lambda': '.lambda_function',
+    'S3': '.s3',
+    'SecretManager': '.secret_manager',
+    'SNS': '.sns',
+}
 
 __all__ = [
     'SecretManager',
@@ -11,3 +16,16 @@ __all__ = [
     'S3',
     'Lambda',
 ]
+
+
+def __getattr__(name):
+    if name not in _MODULES:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+    value = getattr(importlib.import_module(_MODULES[name], __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
@@ -0,0 +1,95 @@
+"""
+Shared factory of boto3 clients, one client per service and region.
+
+boto3 clients are thread-safe, so the concurrent code paths share them. The connection pool of
+each client is sized for those paths, and the timeouts are set per service so that a stalled
+call fails fast instead of waiting for the botocore defaults (60 seconds read timeout).
+"""
+import logging
+import os
+import threading
+
+import boto3
+from botocore.config import Config
+
+import config
+
+_DEFAULT_SETTINGS = {
+    'connect_timeout': 2,
+    'read_timeout': 10,
+    'max_pool_connections': 32,
+    'max_attempts': 3,  # retries after the first attempt
+}
+
+_SERVICE_SETTINGS = {
+    # A proxy crawl takes seconds, no retry here; ProxiesManager retries on another proxy
+    'lambda': {'read_timeout': 30, 'max_attempts': 0},
+    'dynamodb': {'connect_timeout': 1, 'read_timeout': 5, 'max_attempts': 5},
+    's3': {'read_timeout': 20},
+}
+
+_clients = {}
+_lock = threading.Lock()
+
+
+def get_client(service_name: str, region_name: str = None):
+    """
+    Returns the shared client of the service in the region, config.AWS_REGION by default
+    """
+    region_name = region_name or config.AWS_REGION
+    key = (service_name, region_name)
+
+    client = _clients.get(key)
+    if client:
+        return client
+
+    with _lock:
+        if key not in _clients:
+            _clients[key] = _create_client(service_name, region_name)
+        return _clients[key]
+
+
+def warm_up(*service_names: str, region_name: str = None) -> threading.Thread:
+    """
+    Creates the clients ahead of time, e.g. at import time of a handler module, so that they are
+    created during the Lambda init phase rather than by the first invocation.
+    The clients are created in a background thread, overlapping with the rest of the imports of the handler.
+    A caller of get_client() in the meantime waits for the client being created.
+    """
+    def create_clients():
+        for service_name in service_names:
+            try:
+                get_client(service_name, region_name)
+            except Exception as ex:
+                # get_client() will create it again when it is called
+                logging.warning(f'Warming up the {service_name} client failed with {ex!r}')
+
+    thread = threading.Thread(target=create_clients, name='client-warm-up', daemon=True)
+    thread.start()
+    return thread
+
+
+def _create_client(service_name: str, region_name: str):
+    settings = {**_DEFAULT_SETTINGS, **_SERVICE_SETTINGS.get(service_name, {})}
+
+    config_kwargs = {
+        'connect_timeout': settings['connect_timeout'],
+        'read_timeout': settings['read_timeout'],
+        'max_pool_connections': settings['max_pool_connections'],
+        'retries': {
+            'mode': 'adaptive',
+            'max_attempts': settings['max_attempts'],
+        },
+    }
+
+    # tcp_keepalive is only supported by newer botocore versions
+    if 'tcp_keepalive' in Config.OPTION_DEFAULTS:
+        config_kwargs['tcp_keepalive'] = True
+
+    session = boto3.session.Session()
+    return session.client(
+        service_name=service_name,
+        region_name=region_name,
+        endpoint_url=os.environ.get(config.AWS_ENDPOINT_URL_ENV_KEY),
+        config=Config(**config_kwargs)
+    )
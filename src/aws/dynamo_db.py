@@ -1,41 +1,61 @@
 import logging
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator
 
-import boto3
 from botocore.exceptions import ClientError
 
-import config
+from exceptions import RetryableException
+
+from .client_factory import get_client
+
+_BATCH_GET_ITEM_LIMIT = 100
+_BATCH_WRITE_ITEM_LIMIT = 25
+_UNPROCESSED_MAX_ATTEMPTS = 8
+_UNPROCESSED_BACKOFF_SECONDS = 0.05
+_UNPROCESSED_BACKOFF_MAX_SECONDS = 2.0
+_PARALLEL_SCAN_BUFFERED_PAGES = 16
+
+_SEGMENT_DONE = object()
 
 class DynamoDB:
     """
     The client of AWS DynamoDB
     """
-    _client = None
 
-    @classmethod
-    def _get_client(cls):
-        if not cls._client:
-            session = boto3.session.Session()
-            cls._client = session.client(
-                service_name='dynamodb',
-                region_name=config.AWS_REGION
-            )
-        return cls._client
+    @staticmethod
+    def _get_client():
+        return get_client('dynamodb')
 
     @classmethod
-    def get_item(cls, table_name: str, key_attr: dict) -> dict:
+    def get_item(cls, table_name: str, key_attr: dict, projection_expression: str=None, expression_attribute_names: dict=None) -> dict:
         if not table_name:
             raise ValueError(u'table_name is required')
 
         if not key_attr:
             raise ValueError(u'key_attr is required')
 
+        kwargs = {
+            'TableName': table_name,
+            'Key': key_attr
+        }
+
+        if projection_expression:
+            kwargs['ProjectionExpression'] = projection_expression
+
+        if expression_attribute_names:
+            kwargs['ExpressionAttributeNames'] = expression_attribute_names
+
         try:
-            response = cls._get_client().get_item(TableName=table_name, Key=key_attr)
+            response = cls._get_client().get_item(**kwargs)
         except ClientError as e:
             logging.warning(f'GetItem got error: [{e.response}]')
             raise e
 
-        return response['Item']
+        # No Item in the response when the key does not exist
+        return response.get('Item')
 
     @classmethod
     def put_item(cls, table_name: str, item: dict, expression_attribute_values: dict=None) -> dict:
@@ -93,42 +113,146 @@ class DynamoDB:
         return response
 
     @classmethod
-    def query(cls, table_name: str, index_name: str=None, key_condition_expression: str=None, filter_expression: str=None, projection_expression: str=None, expression_attribute_values: dict=None) -> list[dict]:
+    def query(cls, table_name: str, index_name: str=None, key_condition_expression: str=None, filter_expression: str=None, projection_expression: str=None, expression_attribute_values: dict=None, expression_attribute_names: dict=None) -> list[dict]:
+        """
+        Query all the matching items, following LastEvaluatedKey until the last page
+        """
+        return list(cls.iter_query(
+            table_name=table_name,
+            index_name=index_name,
+            key_condition_expression=key_condition_expression,
+            filter_expression=filter_expression,
+            projection_expression=projection_expression,
+            expression_attribute_values=expression_attribute_values,
+            expression_attribute_names=expression_attribute_names
+        ))
+
+    @classmethod
+    def iter_query(cls, table_name: str, index_name: str=None, key_condition_expression: str=None, filter_expression: str=None, projection_expression: str=None, expression_attribute_values: dict=None, expression_attribute_names: dict=None, page_size: int=None) -> Iterator[dict]:
+        """
+        Query items lazily, one page per Query call.
+        The next page is only requested when the items of the current page are consumed.
+        https://boto3.amazonaws.com/v1/documentation/api/latest/reference/services/dynamodb.html#DynamoDB.Client.query
+        """
         if not table_name:
             raise ValueError(u'table_name is required')
 
-        kwargs = {
-            'TableName': table_name,
-        }
-
-        if index_name:
-            kwargs['IndexName'] = index_name
+        kwargs = cls._build_read_kwargs(
+            table_name=table_name,
+            index_name=index_name,
+            filter_expression=filter_expression,
+            projection_expression=projection_expression,
+            expression_attribute_values=expression_attribute_values,
+            expression_attribute_names=expression_attribute_names,
+            page_size=page_size
+        )
 
         if key_condition_expression:
             kwargs['KeyConditionExpression'] = key_condition_expression
 
-        if filter_expression:
-            kwargs['FilterExpression'] = filter_expression
-        
-        if projection_expression:
-            kwargs['ProjectionExpression'] = projection_expression
-
-        if expression_attribute_values:
-            kwargs['ExpressionAttributeValues'] = expression_attribute_values
-
-        try:
-            response = cls._get_client().query(**kwargs)
-        except ClientError as e:
-            logging.warning('Query got error: [%s]/[%s]' % (e.response['Error']['Code'], e.response['Error']['Message']))
-            raise e
-
-        return response['Items']
+        for page in cls._iter_pages('Query', cls._get_client().query, kwargs):
+            yield from page
 
     @classmethod
     def scan(cls, table_name: str, index_name: str=None, filter_expression: str=None, projection_expression: str=None, expression_attribute_values: dict = None) -> list[dict]:
+        """
+        Scan all the matching items, following LastEvaluatedKey until the last page
+        """
+        return list(cls.iter_scan(
+            table_name=table_name,
+            index_name=index_name,
+            filter_expression=filter_expression,
+            projection_expression=projection_expression,
+            expression_attribute_values=expression_attribute_values
+        ))
+
+    @classmethod
+    def iter_scan(cls, table_name: str, index_name: str=None, filter_expression: str=None, projection_expression: str=None, expression_attribute_values: dict=None, page_size: int=None, segment: int=None, total_segments: int=None) -> Iterator[dict]:
+        """
+        Scan items lazily, one page per Scan call.
+        With segment and total_segments, only the given segment of a parallel scan is read.
+        https://boto3.amazonaws.com/v1/documentation/api/latest/reference/services/dynamodb.html#DynamoDB.Client.scan
+        """
         if not table_name:
             raise ValueError(u'table_name is required')
 
+        if (segment is None) != (total_segments is None):
+            raise ValueError(u'segment and total_segments must be provided together')
+
+        kwargs = cls._build_read_kwargs(
+            table_name=table_name,
+            index_name=index_name,
+            filter_expression=filter_expression,
+            projection_expression=projection_expression,
+            expression_attribute_values=expression_attribute_values,
+            page_size=page_size
+        )
+
+        if total_segments is not None:
+            kwargs['Segment'] = segment
+            kwargs['TotalSegments'] = total_segments
+
+        for page in cls._iter_pages('Scan', cls._get_client().scan, kwargs):
+            yield from page
+
+    @classmethod
+    def parallel_scan(cls, table_name: str, total_segments: int, index_name: str=None, filter_expression: str=None, projection_expression: str=None, expression_attribute_values: dict=None, page_size: int=None) -> Iterator[dict]:
+        """
+        Scan the table with one thread per segment, yielding items as the pages arrive.
+        At most _PARALLEL_SCAN_BUFFERED_PAGES pages are held in memory; the segment
+        threads wait for the consumer when it falls behind.
+        """
+        if not total_segments or total_segments < 1:
+            raise ValueError(u'total_segments must be a positive number')
+
+        pages = queue.Queue(maxsize=_PARALLEL_SCAN_BUFFERED_PAGES)
+        stopped = threading.Event()
+
+        def scan_segment(segment: int) -> None:
+            try:
+                kwargs = cls._build_read_kwargs(
+                    table_name=table_name,
+                    index_name=index_name,
+                    filter_expression=filter_expression,
+                    projection_expression=projection_expression,
+                    expression_attribute_values=expression_attribute_values,
+                    page_size=page_size
+                )
+                kwargs['Segment'] = segment
+                kwargs['TotalSegments'] = total_segments
+
+                for page in cls._iter_pages('Scan', cls._get_client().scan, kwargs):
+                    if stopped.is_set():
+                        return
+                    pages.put(page)
+            except Exception as ex:
+                pages.put(ex)
+            finally:
+                pages.put(_SEGMENT_DONE)
+
+        with ThreadPoolExecutor(max_workers=total_segments) as executor:
+            for segment in range(total_segments):
+                executor.submit(scan_segment, segment)
+
+            try:
+                remaining = total_segments
+                while remaining:
+                    page = pages.get()
+                    if page is _SEGMENT_DONE:
+                        remaining -= 1
+                    elif isinstance(page, Exception):
+                        raise page
+                    else:
+                        yield from page
+            finally:
+                # Unblock the segment threads if the consumer stopped early or failed
+                stopped.set()
+                while remaining:
+                    if pages.get() is _SEGMENT_DONE:
+                        remaining -= 1
+
+    @staticmethod
+    def _build_read_kwargs(table_name: str, index_name: str=None, filter_expression: str=None, projection_expression: str=None, expression_attribute_values: dict=None, expression_attribute_names: dict=None, page_size: int=None) -> dict:
         kwargs = {
             'TableName': table_name,
         }
@@ -138,17 +262,114 @@ class DynamoDB:
 
         if filter_expression:
             kwargs['FilterExpression'] = filter_expression
-        
+
         if projection_expression:
             kwargs['ProjectionExpression'] = projection_expression
 
         if expression_attribute_values:
             kwargs['ExpressionAttributeValues'] = expression_attribute_values
 
-        try:
-            response = cls._get_client().scan(**kwargs)
-        except ClientError as e:
-            logging.warning('Scan got error: [%s]/[%s]' % (e.response['Error']['Code'], e.response['Error']['Message']))
-            raise e
+        if expression_attribute_names:
+            kwargs['ExpressionAttributeNames'] = expression_attribute_names
+
+        if page_size:
+            kwargs['Limit'] = page_size
+
+        return kwargs
+
+    @staticmethod
+    def _iter_pages(operation: str, method, kwargs: dict) -> Iterator[list[dict]]:
+        while True:
+            try:
+                response = method(**kwargs)
+            except ClientError as e:
+                logging.warning('%s got error: [%s]/[%s]' % (operation, e.response['Error']['Code'], e.response['Error']['Message']))
+                raise e
+
+            yield response['Items']
+
+            if 'LastEvaluatedKey' not in response:
+                return
+            kwargs = {**kwargs, 'ExclusiveStartKey': response['LastEvaluatedKey']}
+
+    @classmethod
+    def batch_get_item(cls, table_name: str, keys: list[dict], projection_expression: str=None, expression_attribute_names: dict=None) -> list[dict]:
+        """
+        Get items by their primary keys, in chunks of 100 keys per BatchGetItem call.
+        UnprocessedKeys are retried with exponential backoff.
+        https://boto3.amazonaws.com/v1/documentation/api/latest/reference/services/dynamodb.html#DynamoDB.Client.batch_get_item
+        """
+        if not table_name:
+            raise ValueError(u'table_name is required')
+
+        if not keys:
+            return []
+
+        items = []
+        for i in range(0, len(keys), _BATCH_GET_ITEM_LIMIT):
+            keys_and_attributes = {'Keys': keys[i:i + _BATCH_GET_ITEM_LIMIT]}
+
+            if projection_expression:
+                keys_and_attributes['ProjectionExpression'] = projection_expression
+
+            if expression_attribute_names:
+                keys_and_attributes['ExpressionAttributeNames'] = expression_attribute_names
+
+            request_items = {table_name: keys_and_attributes}
+            attempt = 0
+            while request_items:
+                if attempt:
+                    cls._backoff(attempt)
+
+                try:
+                    response = cls._get_client().batch_get_item(RequestItems=request_items)
+                except ClientError as e:
+                    logging.warning('BatchGetItem got error: [%s]/[%s]' % (e.response['Error']['Code'], e.response['Error']['Message']))
+                    raise e
+
+                items.extend(response['Responses'].get(table_name, []))
+                request_items = response.get('UnprocessedKeys')
+
+                attempt += 1
+                if request_items and attempt >= _UNPROCESSED_MAX_ATTEMPTS:
+                    logging.warning(f'BatchGetItem still has unprocessed keys after {attempt} attempts')
+                    raise RetryableException
+
+        return items
+
+    @classmethod
+    def batch_write_item(cls, table_name: str, put_items: list[dict]=None, delete_keys: list[dict]=None) -> None:
+        """
+        Put and delete items in chunks of 25 requests per BatchWriteItem call.
+        UnprocessedItems are retried with exponential backoff.
+        https://boto3.amazonaws.com/v1/documentation/api/latest/reference/services/dynamodb.html#DynamoDB.Client.batch_write_item
+        """
+        if not table_name:
+            raise ValueError(u'table_name is required')
+
+        write_requests = [{'PutRequest': {'Item': x}} for x in put_items or []]
+        write_requests += [{'DeleteRequest': {'Key': x}} for x in delete_keys or []]
+
+        for i in range(0, len(write_requests), _BATCH_WRITE_ITEM_LIMIT):
+            request_items = {table_name: write_requests[i:i + _BATCH_WRITE_ITEM_LIMIT]}
+            attempt = 0
+            while request_items:
+                if attempt:
+                    cls._backoff(attempt)
+
+                try:
+                    response = cls._get_client().batch_write_item(RequestItems=request_items)
+                except ClientError as e:
+                    logging.warning('BatchWriteItem got error: [%s]/[%s]' % (e.response['Error']['Code'], e.response['Error']['Message']))
+                    raise e
+
+                request_items = response.get('UnprocessedItems')
+
+                attempt += 1
+                if request_items and attempt >= _UNPROCESSED_MAX_ATTEMPTS:
+                    logging.warning(f'BatchWriteItem still has unprocessed items after {attempt} attempts')
+                    raise RetryableException
 
-        return response['Items']
+    @staticmethod
+    def _backoff(attempt: int) -> None:
+        time.sleep(min(_UNPROCESSED_BACKOFF_SECONDS * (2 ** attempt), _UNPROCESSED_BACKOFF_MAX_SECONDS))
@@ -1,26 +1,20 @@
 import logging
 
-import boto3
 from botocore.exceptions import ClientError
 
 from exceptions import RetryableException
 
+from .client_factory import get_client
+
 
 class Lambda:
     """
     The client of AWS Lambda
     """
-    _client = {}
 
-    @classmethod
-    def _get_client(cls, region: str):
-        if region not in cls._client:
-            session = boto3.session.Session()
-            cls._client[region] = session.client(
-                service_name='lambda',
-                region_name=region
-            )
-        return cls._client[region]
+    @staticmethod
+    def _get_client(region: str):
+        return get_client('lambda', region)
 
     @classmethod
     def invoke(cls, region: str, arn: str, payload: str) -> str:
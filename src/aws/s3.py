@@ -1,27 +1,24 @@
+import gzip
 import io
 import logging
+from typing import Iterator
 
-import boto3
 from botocore.exceptions import ClientError
+from config import GZIP_COMPRESS_LEVEL
 
-import config
+from .client_factory import get_client
+
+_GZIP_MAGIC_NUMBER = b'\x1f\x8b'
 
 
 class S3:
     """
     The client of AWS S3
     """
-    _client = None
 
-    @classmethod
-    def _get_client(cls):
-        if not cls._client:
-            session = boto3.session.Session()
-            cls._client = session.client(
-                service_name='s3',
-                region_name=config.AWS_REGION
-            )
-        return cls._client
+    @staticmethod
+    def _get_client():
+        return get_client('s3')
 
     @classmethod
     def does_object_exist(cls, bucket: str, key: str) -> bool:
@@ -53,8 +50,8 @@ class S3:
     @classmethod
     def download_file_str(cls, bucket: str, key: str, encoding: str = 'utf-8') -> str:
         """
-        Download an object from S3 to a string.
-        https://boto3.amazonaws.com/v1/documentation/api/latest/reference/services/s3.html#S3.Client.download_fileobj
+        Download an object from S3 to a string, decompressing it if it was uploaded with gzip.
+        https://boto3.amazonaws.com/v1/documentation/api/latest/reference/services/s3.html#S3.Client.get_object
 
         :param bucket:
         :param key:
@@ -68,15 +65,17 @@ class S3:
             raise ValueError(u'key is required')
 
         try:
-            bytes_buffer = io.BytesIO()
-
-            cls._get_client().download_fileobj(
+            response = cls._get_client().get_object(
                 Bucket=bucket,
-                Key=key,
-                Fileobj=bytes_buffer
+                Key=key
             )
 
-            byte_value = bytes_buffer.getvalue()
+            byte_value = response['Body'].read()
+
+            # Objects uploaded before compression was introduced have no ContentEncoding
+            if response.get('ContentEncoding') == 'gzip' or byte_value[:2] == _GZIP_MAGIC_NUMBER:
+                byte_value = gzip.decompress(byte_value)
+
             return byte_value.decode(encoding)
 
         except ClientError as e:
@@ -85,7 +84,7 @@ class S3:
             raise e
 
     @classmethod
-    def upload_file_obj(cls, file: object, bucket: str, key: str) -> None:
+    def upload_file_obj(cls, file: object, bucket: str, key: str, content_encoding: str = None, content_type: str = None) -> None:
         """
         Upload a file-like object to S3.
         https://boto3.amazonaws.com/v1/documentation/api/latest/reference/services/s3.html#S3.Client.upload_fileobj
@@ -93,6 +92,8 @@ class S3:
         :param file:
         :param bucket:
         :param key:
+        :param content_encoding: e.g. "gzip" when the file is already compressed
+        :param content_type:
         :return:
         """
         if not file:
@@ -104,10 +105,103 @@ class S3:
         if not key:
             raise ValueError(u'key is required')
 
+        extra_args = {}
+
+        if content_encoding:
+            extra_args['ContentEncoding'] = content_encoding
+
+        if content_type:
+            extra_args['ContentType'] = content_type
+
         try:
-            cls._get_client().upload_fileobj(file, bucket, key)
+            cls._get_client().upload_fileobj(file, bucket, key, ExtraArgs=extra_args or None)
 
         except ClientError as e:
             # TODO: change back to logging.error
             logging.warning(e)
             raise e
+
+    @classmethod
+    def upload_str(cls, content: str, bucket: str, key: str, compress: bool = True, encoding: str = 'utf-8', content_type: str = 'text/html') -> None:
+        """
+        Upload a string to S3, gzip compressed with ContentEncoding "gzip" unless compress is False.
+        download_file_str() reads both forms back.
+
+        :param content:
+        :param bucket:
+        :param key:
+        :param compress:
+        :param encoding:
+        :param content_type:
+        :return:
+        """
+        if not content:
+            raise ValueError(u'content is required')
+
+        byte_value = content.encode(encoding)
+        content_type = f'{content_type}; charset={encoding}'
+
+        if not compress:
+            cls.upload_file_obj(io.BytesIO(byte_value), bucket, key, content_type=content_type)
+            return
+
+        cls.upload_gzip_bytes(gzip.compress(byte_value, compresslevel=GZIP_COMPRESS_LEVEL), bucket, key, content_type=content_type)
+
+    @classmethod
+    def upload_gzip_bytes(cls, compressed: bytes, bucket: str, key: str, content_type: str = 'text/html; charset=utf-8') -> None:
+        """
+        Upload already gzip-compressed bytes as is, with ContentEncoding "gzip".
+        download_file_str() decompresses them.
+
+        :param compressed:
+        :param bucket:
+        :param key:
+        :param content_type:
+        :return:
+        """
+        if not compressed:
+            raise ValueError(u'compressed is required')
+
+        cls.upload_file_obj(io.BytesIO(compressed), bucket, key, content_encoding='gzip', content_type=content_type)
+
+    @classmethod
+    def iter_object_keys(cls, bucket: str, prefix: str = None, start_after: str = None, page_size: int = None) -> Iterator[list[str]]:
+        """
+        List the object keys of a bucket lazily, one page of keys per list_objects_v2() call.
+        https://boto3.amazonaws.com/v1/documentation/api/latest/reference/services/s3.html#S3.Client.list_objects_v2
+
+        :param bucket:
+        :param prefix:
+        :param start_after: only the keys after this one (in UTF-8 binary order) are listed
+        :param page_size: at most 1000
+        :return:
+        """
+        if not bucket:
+            raise ValueError(u'bucket is required')
+
+        kwargs = {
+            'Bucket': bucket,
+        }
+
+        if prefix:
+            kwargs['Prefix'] = prefix
+
+        if start_after:
+            kwargs['StartAfter'] = start_after
+
+        if page_size:
+            kwargs['MaxKeys'] = page_size
+
+        while True:
+            try:
+                response = cls._get_client().list_objects_v2(**kwargs)
+            except ClientError as e:
+                # TODO: change back to logging.error
+                logging.warning(e)
+                raise e
+
+            yield [x['Key'] for x in response.get('Contents', [])]
+
+            if not response.get('IsTruncated'):
+                return
+            kwargs['ContinuationToken'] = response['NextContinuationToken']
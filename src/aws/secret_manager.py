@@ -1,27 +1,19 @@
 import logging
 
-import boto3
 import base64
 from botocore.exceptions import ClientError
 
-import config
+from .client_factory import get_client
 
 
 class SecretManager:
     """
     The client of AWS Secret Manager
     """
-    _client = None
 
-    @classmethod
-    def _get_client(cls):
-        if not cls._client:
-            session = boto3.session.Session()
-            cls._client = session.client(
-                service_name='secretsmanager',
-                region_name=config.AWS_REGION
-            )
-        return cls._client
+    @staticmethod
+    def _get_client():
+        return get_client('secretsmanager')
 
     # https://docs.aws.amazon.com/secretsmanager/latest/apireference/API_GetSecretValue.html
     @classmethod
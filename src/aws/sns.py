@@ -1,25 +1,18 @@
 import logging
-import boto3
+
 from botocore.exceptions import ClientError
 
-import config
+from .client_factory import get_client
 
 
 class SNS:
     """
     The client of AWS SNS
     """
-    _client = None
 
-    @classmethod
-    def _get_client(cls):
-        if not cls._client:
-            session = boto3.session.Session()
-            cls._client = session.client(
-                service_name='sns',
-                region_name=config.AWS_REGION
-            )
-        return cls._client
+    @staticmethod
+    def _get_client():
+        return get_client('sns')
 
     @classmethod
     def publish(cls, target_arn, message, subject):
@@ -1,5 +1,9 @@
 # AWS
 AWS_REGION = "us-west-2"
+AWS_ENDPOINT_URL_ENV_KEY = 'AWS_ENDPOINT_URL'  # e.g. a local moto server or MinIO, unset on AWS
+
+# gzip level of the pages and job descriptions written to S3 and DynamoDB
+GZIP_COMPRESS_LEVEL = 6
 
 # TODO: change to Lambda environment varialbes
 MYSQL_HOST = "tmwsfdnrcwbmp4.ca9x6xep5ulo.us-west-2.rds.amazonaws.com"
@@ -8,8 +12,23 @@ MYSQL_SECRET_NAME = "MySQL_application"
 
 # Indeed
 BUCKET_INDEED_JOB_POSTING_ENV_KEY = 'INDEED_JOB_POSTING_S3_BUCKET'
+INDEED_JOB_PARSER_BACKEND_ENV_KEY = 'INDEED_JOB_PARSER_BACKEND'
+INDEED_DOWNLOADER_PARSE_ENV_KEY = 'INDEED_DOWNLOADER_PARSE'
 
 DYNAMODB_TABLE_CRAWLER_PROXY_ENV_KEY = 'CRAWLER_PROXY_TABLE'
+DYNAMODB_TABLE_CRAWL_RATE_LIMIT_ENV_KEY = 'CRAWL_RATE_LIMIT_TABLE'
 DYNAMODB_TABLE_JOB_POSTING_ENV_KEY = 'JOB_POSTING_TABLE'
+DYNAMODB_TABLE_JOB_POSTING_EXTERNAL_ID_ENV_KEY = 'JOB_POSTING_EXTERNAL_ID_TABLE'
+DYNAMODB_TABLE_SEARCH_WATERMARK_ENV_KEY = 'SEARCH_WATERMARK_TABLE'
+
+# Job descriptions larger than the threshold are stored out of the JobPosting item, see models/job_posting.py
+JOB_DESCRIPTION_OFFLOAD_ENV_KEY = 'JOB_DESCRIPTION_OFFLOAD'  # 'none' (default), 'compress' or 's3'
+JOB_DESCRIPTION_OFFLOAD_THRESHOLD_BYTES_ENV_KEY = 'JOB_DESCRIPTION_OFFLOAD_THRESHOLD_BYTES'
+BUCKET_JOB_DESCRIPTION_ENV_KEY = 'JOB_DESCRIPTION_S3_BUCKET'  # required by the 's3' offload
+
+# Crawler
+CRAWL_HEDGE_AFTER_SECONDS_ENV_KEY = 'CRAWL_HEDGE_AFTER_SECONDS'
+CRAWL_DOMAIN_RATE_PER_SECOND_ENV_KEY = 'CRAWL_DOMAIN_RATE_PER_SECOND'
+CRAWL_REGION_RATE_PER_SECOND_ENV_KEY = 'CRAWL_REGION_RATE_PER_SECOND'
 
 STATE_MACHINE_EXECUTION_NOTIFICATION_TOPIC = "STATE_MACHINE_EXECUTION_NOTIFICATION_TOPIC"
\ No newline at end of file
@@ -1,5 +1,7 @@
 """ Web Crawler Module """
 
+from .crawl_response import CrawlResponse
 from .proxies_manager import ProxiesManager
+from .rate_limiter import RateLimiter
 
-__all__ = ['ProxiesManager']
+__all__ = ['CrawlResponse', 'ProxiesManager', 'RateLimiter']
@@ -0,0 +1,60 @@
+import base64
+import gzip
+import zlib
+
+from config import GZIP_COMPRESS_LEVEL
+
+_ENCODING = 'utf-8'
+_GZIP_WBITS = 16 + zlib.MAX_WBITS
+# Compressed bytes inflated at a time by contains()
+_SEARCH_CHUNK_BYTES = 16 * 1024
+
+
+class CrawlResponse:
+    """
+    A page crawled through a proxy.
+
+    A proxy may return the page gzip-compressed and base64-encoded ("contentEncoding": "gzip"). The page is
+    then kept compressed, it is only decompressed to be searched or read as text, and can be uploaded as is.
+    """
+
+    def __init__(self, url: str, content: str = None, compressed_content: bytes = None):
+        if content is None and compressed_content is None:
+            raise ValueError(u'content or compressed_content is required')
+
+        self.url = url
+        self._content = content
+        self._compressed_content = compressed_content
+
+    @classmethod
+    def from_proxy_response(cls, response: dict) -> 'CrawlResponse':
+        if response.get('contentEncoding') == 'gzip':
+            return cls(url=response['url'], compressed_content=base64.b64decode(response['content']))
+        return cls(url=response['url'], content=response['content'])
+
+    @property
+    def content(self) -> str:
+        if self._content is None:
+            self._content = gzip.decompress(self._compressed_content).decode(_ENCODING)
+        return self._content
+
+    @property
+    def compressed_content(self) -> bytes:
+        if self._compressed_content is None:
+            self._compressed_content = gzip.compress(self._content.encode(_ENCODING), compresslevel=GZIP_COMPRESS_LEVEL)
+        return self._compressed_content
+
+    def contains(self, text: str) -> bool:
+        if self._content is not None:
+            return text in self._content
+        # Inflated chunk by chunk, neither the decompressed nor the decoded page is held in memory
+        needle = text.encode(_ENCODING)
+        decompressor = zlib.decompressobj(wbits=_GZIP_WBITS)
+        # The end of the previous chunk, for a match across two chunks
+        tail = b''
+        for i in range(0, len(self._compressed_content), _SEARCH_CHUNK_BYTES):
+            chunk = tail + decompressor.decompress(self._compressed_content[i:i + _SEARCH_CHUNK_BYTES])
+            if needle in chunk:
+                return True
+            tail = chunk[max(len(chunk) - len(needle) + 1, 0):]
+        return needle in tail + decompressor.flush()
@@ -1,60 +1,358 @@
 import json
 import logging
+import os
 import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
+from concurrent.futures import TimeoutError as FuturesTimeoutError
 from datetime import datetime, timedelta
+from urllib.parse import urlparse
 
 from aws import Lambda
+from config import CRAWL_HEDGE_AFTER_SECONDS_ENV_KEY
+from crawler.crawl_response import CrawlResponse
+from crawler.rate_limiter import RateLimiter
 from exceptions import RetryableException
-from models.crawler_proxy import CrawlerProxy, deactivate_crawler_proxy, list_active_crawler_proxy
+from models.crawler_proxy import (OUTCOME_CAPTCHA, OUTCOME_EMPTY_CONTENT,
+                                  OUTCOME_HEDGED, OUTCOME_INVOKE_ERROR,
+                                  OUTCOME_MALFORMED_RESPONSE,
+                                  OUTCOME_STATUS_CODE_ERROR, OUTCOME_SUCCESS,
+                                  CrawlerProxy, deactivate_crawler_proxy,
+                                  list_active_crawler_proxy,
+                                  record_crawler_proxy_stats)
 
-DEACTIVATED_WAIT_TIME = timedelta(hours=12)
+# Cooldown of a proxy after a bad response, doubling for every consecutive failure
+COOLDOWN_BASE = timedelta(minutes=15)
+COOLDOWN_MAX = timedelta(hours=12)
+PROXY_POOL_TTL = timedelta(minutes=5)
+STATS_FLUSH_INTERVAL = timedelta(minutes=1)
+# Around the p95 latency of a proxy crawl, 0 disables hedging
+HEDGE_AFTER_SECONDS = float(os.environ.get(CRAWL_HEDGE_AFTER_SECONDS_ENV_KEY, '4'))
+MAX_CRAWL_ATTEMPTS = 3
+
+# Time kept for the work after the crawl, e.g. uploading the page and writing DynamoDB
+_DEADLINE_MARGIN_SECONDS = 2.0
+_MIN_ATTEMPT_SECONDS = 1.0
+
+# Latency assumed for a proxy which has not served any request in this container yet
+_DEFAULT_LATENCY_SECONDS = 3.0
+
+
+class _ProxyStats:
+    """ Outcomes of the calls to a proxy, aggregated in this container """
+
+    def __init__(self):
+        self.success_count = 0
+        self.failure_count = 0
+        self.total_latency_seconds = 0.0
+
+        # Not yet flushed to CrawlerProxyTable
+        self.pending_outcome_counts: dict[str, int] = {}
+        self.pending_latency_millis = 0
+
+    def success_rate(self) -> float:
+        # Laplace smoothing, so an unused proxy starts at 0.5 instead of 0 or 1
+        return (self.success_count + 1) / (self.success_count + self.failure_count + 2)
+
+    def average_latency_seconds(self) -> float:
+        if not self.success_count:
+            return _DEFAULT_LATENCY_SECONDS
+        return self.total_latency_seconds / self.success_count
+
+
+# The pool lives at module level so that it survives across warm invocations
+_proxy_pool: list[CrawlerProxy] = []
+_proxy_pool_expires_at = datetime.min
+_proxy_stats: dict[str, _ProxyStats] = {}
+_stats_flushed_at = datetime.now()
+_lock = threading.Lock()
+# Shared rather than per call, so that returning does not wait for an abandoned hedged invoke.
+# An abandoned invoke cannot be interrupted, it keeps running until the read timeout of the Lambda
+# client at most, and resumes in the next invocation when the container is frozen in the meantime.
+# Its response is then discarded, see _crawl_with_proxy().
+# Sized for the 8 crawling threads of the batch downloader, each with a first and a hedged invoke running,
+# and as many abandoned ones.
+_hedge_executor = ThreadPoolExecutor(max_workers=32)
 
 
 class ProxiesManager:
     """ The manager for proxy Lambda functions """
 
     @staticmethod
-    def _get_random_proxy() -> CrawlerProxy:
-        available_proxies = list_active_crawler_proxy(datetime.now() - DEACTIVATED_WAIT_TIME)
-        logging.info(f'available_proxies: {available_proxies}')
+    def _get_proxy_pool() -> list[CrawlerProxy]:
+        global _proxy_pool, _proxy_pool_expires_at
+
+        with _lock:
+            # An emptied pool is reloaded right away, proxies might have been reactivated elsewhere
+            if _proxy_pool and datetime.now() < _proxy_pool_expires_at:
+                return list(_proxy_pool)
+
+        # Loaded without holding the lock, the crawling threads keep recording outcomes meanwhile.
+        # Concurrent refreshes may both load, the last one wins.
+        proxy_pool = list_active_crawler_proxy(datetime.now())
+
+        with _lock:
+            _proxy_pool = proxy_pool
+            _proxy_pool_expires_at = datetime.now() + PROXY_POOL_TTL
+            logging.info(f'Refreshed proxy pool: {[x.id for x in _proxy_pool]}')
+            return list(_proxy_pool)
+
+    @staticmethod
+    def _get_weight(proxy: CrawlerProxy) -> float:
+        with _lock:
+            stats = _proxy_stats.get(proxy.id) or _ProxyStats()
+            success_rate = stats.success_rate()
+            latency = stats.average_latency_seconds()
+
+        return success_rate / (1 + proxy.deactivated_count) / latency
+
+    @classmethod
+    def _get_proxy(cls, excluded: list[CrawlerProxy] = None) -> CrawlerProxy:
+        """
+        Pick a proxy by weight. Proxies in the regions of the excluded ones are preferred against,
+        then the excluded proxies themselves are left out.
+        """
+        available_proxies = cls._get_proxy_pool()
+
+        if excluded:
+            excluded_ids = {x.id for x in excluded}
+            excluded_regions = {x.region for x in excluded}
+            available_proxies = (
+                [x for x in available_proxies if x.region not in excluded_regions]
+                or [x for x in available_proxies if x.id not in excluded_ids]
+            )
+
         if len(available_proxies) == 0:
             logging.warning(f'There is no active proxy at the moment')
             raise RetryableException
-        return available_proxies[random.randrange(len(available_proxies))]
+        weights = [cls._get_weight(x) for x in available_proxies]
+        return random.choices(available_proxies, weights=weights)[0]
+
+    @staticmethod
+    def _record_outcome(proxy_id: str, outcome: str, latency_seconds: float) -> None:
+        logging.info(f'Proxy [{proxy_id}] call outcome [{outcome}] in {latency_seconds:.3f}s')
+
+        with _lock:
+            stats = _proxy_stats.setdefault(proxy_id, _ProxyStats())
+            if outcome == OUTCOME_SUCCESS:
+                stats.success_count += 1
+                stats.total_latency_seconds += latency_seconds
+            else:
+                stats.failure_count += 1
+
+            stats.pending_outcome_counts[outcome] = stats.pending_outcome_counts.get(outcome, 0) + 1
+            stats.pending_latency_millis += int(latency_seconds * 1000)
+
+    @staticmethod
+    def flush_stats(force: bool = False) -> None:
+        """
+        Add the outcomes recorded since the last flush to the counters in CrawlerProxyTable,
+        at most once per STATS_FLUSH_INTERVAL unless forced
+        """
+        global _stats_flushed_at
+
+        with _lock:
+            if not force and datetime.now() - _stats_flushed_at < STATS_FLUSH_INTERVAL:
+                return
+
+            pending = {}
+            for proxy_id, stats in _proxy_stats.items():
+                if stats.pending_outcome_counts:
+                    pending[proxy_id] = (stats.pending_outcome_counts, stats.pending_latency_millis)
+                    stats.pending_outcome_counts = {}
+                    stats.pending_latency_millis = 0
+            _stats_flushed_at = datetime.now()
+
+        for proxy_id, (outcome_counts, latency_millis) in pending.items():
+            # Only successes since the last flush: the proxy has recovered, its failure streak is cleared
+            recovered = set(outcome_counts) == {OUTCOME_SUCCESS}
+            try:
+                record_crawler_proxy_stats(proxy_id, outcome_counts, latency_millis, reset_failure_streak=recovered)
+            except Exception as ex:
+                # Telemetry must not fail the crawl, these counts are dropped
+                logging.warning(f'Flushing the stats of proxy [{proxy_id}] failed with {ex!r}')
 
     @staticmethod
-    def _deactivate_proxy(proxy_id: str) -> None:
+    def get_cooldown(failure_streak: int) -> timedelta:
+        """
+        The cooldown after the n-th consecutive failure: COOLDOWN_BASE, doubled for each repeated
+        failure, capped at COOLDOWN_MAX
+        """
+        if failure_streak <= 1:
+            return COOLDOWN_BASE
+        # Capping the exponent keeps the multiplication small for long streaks
+        return min(COOLDOWN_BASE * (2 ** min(failure_streak - 1, 32)), COOLDOWN_MAX)
+
+    @classmethod
+    def _deactivate_proxy(cls, crawler_proxy: CrawlerProxy) -> None:
+        global _proxy_pool
+
+        with _lock:
+            _proxy_pool = [x for x in _proxy_pool if x.id != crawler_proxy.id]
+
+        cooldown = cls.get_cooldown(crawler_proxy.failure_streak + 1)
         try:
-            deactivate_crawler_proxy(proxy_id)
-            logging.info(f'Proxy {proxy_id} deactivated')
+            deactivate_crawler_proxy(crawler_proxy.id, datetime.now() + cooldown)
+            logging.info(f'Proxy {crawler_proxy.id} deactivated for {cooldown}')
         except Exception as ex:
             raise RetryableException(ex)
 
-    def crawl(self, url: str):
-        crawler_proxy = self._get_random_proxy()
-        r = Lambda.invoke(crawler_proxy.region, crawler_proxy.arn, json.dumps({'url': url}))
+    def crawl(self, url: str, context=None) -> CrawlResponse:
+        """
+        Crawl the URL through a proxy, failing over to other proxies (other regions first) up to
+        MAX_CRAWL_ATTEMPTS times. With the Lambda context, no attempt is started or waited for past
+        the remaining time of the invocation minus _DEADLINE_MARGIN_SECONDS.
+        Every request to a proxy waits for the rate limits of the target domain and the proxy region.
+        """
+        deadline = self._get_deadline(context)
+        tried_proxies = []
+        error = None
+
+        for attempt in range(MAX_CRAWL_ATTEMPTS):
+            if deadline and deadline - time.monotonic() < _MIN_ATTEMPT_SECONDS:
+                logging.warning(f'Not enough time left for crawl attempt {attempt + 1} of URL "{url}"')
+                break
+
+            try:
+                crawler_proxy = self._get_proxy(excluded=tried_proxies)
+            except RetryableException:
+                if not tried_proxies:
+                    raise
+                logging.warning(f'All the active proxies have been tried for URL "{url}"')
+                break
+
+            try:
+                return self._hedged_crawl(url, crawler_proxy, tried_proxies, deadline)
+            except Exception as ex:
+                logging.warning(f'Crawl attempt {attempt + 1} of URL "{url}" failed with {ex!r}')
+                error = ex
+            finally:
+                self.flush_stats()
+
+        raise error or RetryableException
+
+    @staticmethod
+    def _get_deadline(context) -> float:
+        if not context:
+            return None
+        return time.monotonic() + context.get_remaining_time_in_millis() / 1000 - _DEADLINE_MARGIN_SECONDS
+
+    def _hedged_crawl(self, url: str, crawler_proxy: CrawlerProxy, tried_proxies: list[CrawlerProxy], deadline: float = None) -> CrawlResponse:
+        """
+        When HEDGE_AFTER_SECONDS is set and the proxy has not answered by then, the URL is also sent to
+        a proxy in another region, and the first valid response wins.
+        """
+        # Before the hedge timer starts, the wait for the rate limits does not count as a slow proxy
+        RateLimiter.acquire_crawl(urlparse(url).netloc, crawler_proxy.region, deadline)
+
+        tried_proxies.append(crawler_proxy)
+        # Set once this call returns, the invokes still running are abandoned
+        abandoned = threading.Event()
+        started = threading.Event()
+        futures = [_hedge_executor.submit(self._crawl_with_proxy, crawler_proxy, url, deadline, abandoned, started)]
+
+        if HEDGE_AFTER_SECONDS:
+            # Timed from the start of the invoke, the executor may have queued it behind other crawls
+            started.wait(timeout=max(deadline - time.monotonic(), 0) if deadline else None)
+            started_at = time.monotonic()
+            if started.is_set() and (not deadline or deadline - started_at > HEDGE_AFTER_SECONDS):
+                done, _ = wait(futures, timeout=HEDGE_AFTER_SECONDS)
+                if not done:
+                    # Recorded now, the invoke may never be answered, or be discarded once abandoned.
+                    # Otherwise a proxy slower than HEDGE_AFTER_SECONDS would keep its weight.
+                    self._record_outcome(crawler_proxy.id, OUTCOME_HEDGED, time.monotonic() - started_at)
+                    try:
+                        hedge_proxy = self._get_proxy(excluded=tried_proxies)
+                        logging.info(f'Proxy [{crawler_proxy.id}] did not answer in {HEDGE_AFTER_SECONDS}s, hedging with proxy [{hedge_proxy.id}]')
+                        tried_proxies.append(hedge_proxy)
+                        futures.append(_hedge_executor.submit(self._rate_limited_crawl_with_proxy, hedge_proxy, url, deadline, abandoned))
+                    except RetryableException:
+                        logging.info(f'No other proxy to hedge with, waiting for proxy [{crawler_proxy.id}]')
+
+        timeout = max(deadline - time.monotonic(), 0) if deadline else None
+        error = None
+        try:
+            for future in as_completed(futures, timeout=timeout):
+                try:
+                    return future.result()
+                except Exception as ex:
+                    error = ex
+        except FuturesTimeoutError:
+            logging.warning(f'No proxy answered URL "{url}" before the deadline')
+            raise RetryableException
+        finally:
+            # The invokes not started yet are cancelled, the running ones are abandoned
+            abandoned.set()
+            for future in futures:
+                future.cancel()
+
+        raise error
+
+    def _rate_limited_crawl_with_proxy(self, crawler_proxy: CrawlerProxy, url: str, deadline: float = None, abandoned: threading.Event = None) -> CrawlResponse:
+        # Waits in the worker thread, the first proxy may still answer meanwhile
+        RateLimiter.acquire_crawl(urlparse(url).netloc, crawler_proxy.region, deadline)
+        if abandoned and abandoned.is_set():
+            raise RetryableException
+
+        return self._crawl_with_proxy(crawler_proxy, url, deadline, abandoned)
+
+    def _crawl_with_proxy(self, crawler_proxy: CrawlerProxy, url: str, deadline: float = None, abandoned: threading.Event = None, started: threading.Event = None) -> CrawlResponse:
+        if started:
+            started.set()
+        start = time.monotonic()
+        try:
+            # Proxies which support it return the page gzip-compressed, the others ignore acceptEncoding
+            r = Lambda.invoke(crawler_proxy.region, crawler_proxy.arn, json.dumps({'url': url, 'acceptEncoding': 'gzip'}))
+        except Exception:
+            self._record_outcome(crawler_proxy.id, OUTCOME_INVOKE_ERROR, time.monotonic() - start)
+            raise
+        latency_seconds = time.monotonic() - start
+
+        if abandoned and abandoned.is_set():
+            # The crawl has been answered by another proxy or given up, possibly in a previous invocation.
+            # Neither the outcome is recorded nor the proxy deactivated from here, a hedged proxy has had
+            # its OUTCOME_HEDGED recorded already.
+            logging.info(f'Discarding the response of proxy [{crawler_proxy.id}] to the abandoned crawl of URL "{url}" after {latency_seconds:.3f}s')
+            raise RetryableException
+
         response = json.loads(r)
-        logging.info(f'ProxiesManager crawl response {response}')
+        del r
+        logging.info(f'ProxiesManager crawl response {_summarize_response(response)}')
 
         if 'statusCode' not in response:
             # TODO: change to logging.error
-            logging.warning(f'Getting URL "{url}" error with response {response}')
-            self._deactivate_proxy(crawler_proxy.id)
+            logging.warning(f'Getting URL "{url}" error with response {_summarize_response(response)}')
+            self._record_outcome(crawler_proxy.id, OUTCOME_MALFORMED_RESPONSE, latency_seconds)
+            self._deactivate_proxy(crawler_proxy)
             raise RetryableException
         
         if response['statusCode'] != 200:
             logging.warning(f'Getting URL "{url}" resulted in status code {response["statusCode"]}')
-            self._deactivate_proxy(crawler_proxy.id)
+            self._record_outcome(crawler_proxy.id, OUTCOME_STATUS_CODE_ERROR, latency_seconds)
+            self._deactivate_proxy(crawler_proxy)
             raise RetryableException
 
         if 'content' not in response or not response['content']:
             logging.warning(f'Proxy in region [{crawler_proxy.region}] received empty content')
-            self._deactivate_proxy(crawler_proxy.id)
+            self._record_outcome(crawler_proxy.id, OUTCOME_EMPTY_CONTENT, latency_seconds)
+            self._deactivate_proxy(crawler_proxy)
             raise RetryableException
 
-        if 'www.hcaptcha.com' in response['content']:
+        crawl_response = CrawlResponse.from_proxy_response(response)
+        del response
+
+        if crawl_response.contains('www.hcaptcha.com'):
             logging.warning(f'Proxy in region [{crawler_proxy.region}] received hcaptcha check')
-            self._deactivate_proxy(crawler_proxy.id)
+            self._record_outcome(crawler_proxy.id, OUTCOME_CAPTCHA, latency_seconds)
+            self._deactivate_proxy(crawler_proxy)
             raise RetryableException
 
-        return response['content'], response['url']
+        self._record_outcome(crawler_proxy.id, OUTCOME_SUCCESS, latency_seconds)
+
+        return crawl_response
+
+
+def _summarize_response(response: dict) -> dict:
+    # The page itself is left out of the logs
+    return {k: (f'<{len(v)} characters>' if k == 'content' and v else v) for k, v in response.items()}
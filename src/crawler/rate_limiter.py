@@ -0,0 +1,68 @@
+import logging
+import os
+import random
+import time
+
+from config import (CRAWL_DOMAIN_RATE_PER_SECOND_ENV_KEY,
+                    CRAWL_REGION_RATE_PER_SECOND_ENV_KEY)
+from exceptions import RetryableException
+from models.crawl_rate_limit import acquire_crawl_token
+
+# Ceilings on the requests per second sent to a target domain, and through the proxies of an AWS region,
+# across every concurrent crawler. 0 disables the limit.
+DOMAIN_RATE_PER_SECOND = int(os.environ.get(CRAWL_DOMAIN_RATE_PER_SECOND_ENV_KEY, '2'))
+REGION_RATE_PER_SECOND = int(os.environ.get(CRAWL_REGION_RATE_PER_SECOND_ENV_KEY, '1'))
+
+# Spreads the crawlers which were refused in the same second over the next one
+_MAX_JITTER_SECONDS = 0.2
+
+# The last second in which each key was refused, shared by the crawling threads of the container.
+# Until that second is over, the threads wait for the next one without writing to DynamoDB again.
+_exhausted_seconds: dict[str, int] = {}
+
+
+class RateLimiter:
+    """
+    A distributed rate limiter, counting the requests of every crawler per key and per second in DynamoDB.
+    A crawler over the limit sleeps until the next second, and only then tries again.
+    """
+
+    @classmethod
+    def acquire_crawl(cls, domain: str, region: str, deadline: float = None) -> None:
+        """
+        Waits until a request to the domain through a proxy in the region is allowed.
+        Raises RetryableException when it is not allowed before the deadline (time.monotonic()).
+        """
+        # The domain limit first, it is shared by every crawler and is the longer wait. A region token
+        # taken before that wait would be held unused, or lost when the deadline passes.
+        if DOMAIN_RATE_PER_SECOND:
+            cls.acquire(f'domain#{domain}', DOMAIN_RATE_PER_SECOND, deadline)
+        if REGION_RATE_PER_SECOND:
+            cls.acquire(f'region#{region}', REGION_RATE_PER_SECOND, deadline)
+
+    @staticmethod
+    def acquire(key: str, rate_per_second: int, deadline: float = None) -> None:
+        if not key:
+            raise ValueError(u'key is required')
+
+        if rate_per_second <= 0:
+            raise ValueError(u'rate_per_second must be a positive number')
+
+        waited_seconds = 0.0
+        while True:
+            now = time.time()
+            second = int(now)
+            if _exhausted_seconds.get(key) != second:
+                if acquire_crawl_token(key, second, rate_per_second):
+                    if waited_seconds:
+                        logging.info(f'Rate limit [{key}] acquired after {waited_seconds:.2f}s')
+                    return
+                _exhausted_seconds[key] = second
+
+            wait_seconds = second + 1 - now + random.uniform(0, _MAX_JITTER_SECONDS)
+            if deadline and time.monotonic() + wait_seconds > deadline:
+                logging.warning(f'Rate limit [{key}] not acquired before the deadline')
+                raise RetryableException
+
+            time.sleep(wait_seconds)
+            waited_seconds += wait_seconds
@@ -1,6 +1,4 @@
 import logging
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
 
 import config
 import json
@@ -27,12 +25,15 @@ class MySQLClient:
     @classmethod
     def _get_engine(cls):
         if not cls._engine:
+            # SQLAlchemy is imported on first use, it is heavy and most functions never use MySQL
+            from sqlalchemy import create_engine
             cls._engine = create_engine(cls.get_sqlalchemy_connection_string())
         return cls._engine
 
     @classmethod
     def _get_session_maker(cls):
         if not cls._session_maker:
+            from sqlalchemy.orm import sessionmaker
             cls._session_maker = sessionmaker(bind=cls._get_engine())
         return cls._session_maker
 
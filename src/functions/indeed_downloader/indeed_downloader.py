@@ -1,22 +1,44 @@
 import logging
 import os
-from io import BytesIO
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 from urllib.parse import parse_qs, urlparse, urlunparse
 
+from aws.client_factory import warm_up
 from aws.s3 import S3
-from config import BUCKET_INDEED_JOB_POSTING_ENV_KEY
+from config import (BUCKET_INDEED_JOB_POSTING_ENV_KEY,
+                    INDEED_DOWNLOADER_PARSE_ENV_KEY)
+from crawler.crawl_response import CrawlResponse
 from crawler.proxies_manager import ProxiesManager
 from exceptions.exceptions import MalFormedMessageException, RetryableException
-from models.job_posting import (create_job_posting,
+from models.job_posting import (JobPosting, compute_content_hash,
+                                compute_parsed_hash, create_job_posting,
+                                get_job_posting,
                                 get_job_posting_by_external_id,
                                 get_job_posting_by_origin_url,
-                                update_job_posting_origin_url)
+                                update_job_posting_download_state,
+                                update_job_posting_from_parsed_info)
+from models.job_posting_external_id import put_job_posting_external_id
 
 _SOURCE = 'ca.indeed.com'
 _UPLOAD_BUCKET = os.environ[BUCKET_INDEED_JOB_POSTING_ENV_KEY]
+_BATCH_MAX_WORKERS = 8
+# Parse the downloaded page right away, rather than in a separate IndeedJobParserFunction invocation
+_PARSE = os.environ.get(INDEED_DOWNLOADER_PARSE_ENV_KEY, 'false').lower() == 'true'
+
+_STATUS_DOWNLOADED = 'DOWNLOADED'
+_STATUS_SKIPPED = 'SKIPPED'
+_STATUS_FAILED = 'FAILED'
+
+if _PARSE:
+    # bs4 is only imported by the functions which parse
+    from parsers.indeed_job_posting import parse_job_posting
 
 logging.getLogger().setLevel(logging.INFO)
 
+warm_up('dynamodb', 's3')
+
 def lambda_handler(event, context):
     # Input: {"url":"https://ca.indeed.com/rc/clk?jk=1b9d06ebdd34033a&fccid=3002307a9e5b4706&vjs=3"}
 
@@ -25,18 +47,64 @@ def lambda_handler(event, context):
     url = _parse_event(event)
     logging.info(f'Parsed url {url}')
 
-    if not _should_download(url):
-        return _build_response('')
+    s3_key, parsed = _download(url, context)
 
-    content, redirected_url = ProxiesManager().crawl(url)
+    return _build_response(s3_key, parsed)
 
-    s3_key = _process_response(url, redirected_url, content)
-    
-    return _build_response(s3_key)
+def batch_lambda_handler(event, context):
+    # Input: {"urls":["https://ca.indeed.com/rc/clk?jk=1b9d06ebdd34033a&fccid=3002307a9e5b4706&vjs=3", ...]}
+
+    logging.info("Entering Indeed Downloader batch_lambda_handler")
+
+    urls = _parse_batch_event(event)
+    logging.info(f'Parsed {len(urls)} urls')
+
+    if not urls:
+        return _build_batch_response([])
+
+    # Each worker picks its own proxy from ProxiesManager, so the crawls are spread across the pool
+    with ThreadPoolExecutor(max_workers=min(_BATCH_MAX_WORKERS, len(urls))) as executor:
+        results = list(executor.map(lambda url: _download_with_status(url, context), urls))
+
+    return _build_batch_response(results)
+
+def _download(url: str, context=None) -> tuple[str, bool]:
+    """
+    Returns the S3 key of the page to parse, empty when there is nothing to parse,
+    and whether the page has been parsed already
+    """
+    existing = get_job_posting_by_origin_url(url, fields=['origin_url', 'external_id', 'uploaded_datetime'])
+
+    if not _should_download(url, existing):
+        return '', False
+
+    crawl_response = ProxiesManager().crawl(url, context)
+
+    return _process_response(url, crawl_response, existing)
+
+def _download_with_status(url: str, context=None) -> dict:
+    try:
+        s3_key, parsed = _download(url, context)
+    except Exception as ex:
+        logging.warning(f'Downloading URL "{url}" failed with {ex!r}')
+        return {'url': url, 's3_key': '', 'status': _STATUS_FAILED, 'parsed': False}
 
-def _build_response(s3_key: str) -> dict:
     return {
-        "s3_key": s3_key
+        'url': url,
+        's3_key': s3_key or '',
+        'status': _STATUS_DOWNLOADED if s3_key else _STATUS_SKIPPED,
+        'parsed': parsed
+    }
+
+def _build_response(s3_key: str, parsed: bool = False) -> dict:
+    return {
+        "s3_key": s3_key,
+        "parsed": parsed
+    }
+
+def _build_batch_response(results: list[dict]) -> dict:
+    return {
+        "job_postings": results
     }
 
 def _parse_event(event) -> str:
@@ -48,69 +116,160 @@ def _parse_event(event) -> str:
 
     return event['url']
 
-def _should_download(url: str) -> bool:
-    existing = get_job_posting_by_origin_url(url)
+def _parse_batch_event(event) -> list[str]:
+    """
+    Parse the event of batch_lambda_handler, duplicated URLs are only downloaded once
+    """
+    if 'urls' not in event or not isinstance(event['urls'], list):
+        raise MalFormedMessageException(f'Message {event} is malformed')
+
+    return list(dict.fromkeys(event['urls']))
 
-    if existing and S3.does_object_exist(bucket=_UPLOAD_BUCKET, key=existing.id):
+def _should_download(url: str, existing: JobPosting) -> bool:
+    if existing and _is_uploaded(existing):
         logging.info(f'The Job Posting of {url} already exist, skipping...')
         return False
 
     return True
 
-def _process_response(origin_url: str, final_url: str, content: str) -> str:
+def _is_uploaded(job_posting: JobPosting) -> bool:
+    if job_posting.uploaded_datetime:
+        return True
+
+    # Records created before UploadedDatetime was tracked, check S3 once and record the result
+    if S3.does_object_exist(bucket=_UPLOAD_BUCKET, key=job_posting.id):
+        job_posting.uploaded_datetime = datetime.now()
+        update_job_posting_download_state(job_posting_id=job_posting.id, uploaded_datetime=job_posting.uploaded_datetime)
+        return True
+
+    return False
+
+def _process_response(origin_url: str, crawl_response: CrawlResponse, existing_by_origin_url: JobPosting = None) -> tuple[str, bool]:
+    final_url = crawl_response.url
     if bool(urlparse(final_url).netloc) and 'indeed' not in final_url:
         logging.warning(f'Redirected to unsupported URL {final_url}, discarding...')
-        return
+        return '', False
 
     source = _SOURCE
     external_id = _parse_external_id(final_url)
 
     if not external_id:
         logging.warning(f'Cannot determine external ID from the URL {final_url}, discarding...')
-        return
+        return '', False
 
     try:
-        existing = get_job_posting_by_external_id(external_id)
+        if existing_by_origin_url and existing_by_origin_url.external_id == external_id:
+            # Already resolved by the origin URL lookup, and known not to be uploaded
+            existing = existing_by_origin_url
+            uploaded = False
+        else:
+            existing = get_job_posting_by_external_id(external_id, fields=['origin_url', 'uploaded_datetime'])
+            uploaded = bool(existing) and _is_uploaded(existing)
+
         if existing:
             # TODO: consider updating existing record?
             logging.info(
                 f'JobPosting record with source "{source}" external_id "{external_id}" already exists')
 
+            new_origin_url = None
             if not existing.origin_url:
                 logging.info(f'Updating JobPosting record [{existing.id}] with origin_url [{origin_url}]')
-                update_job_posting_origin_url(job_posting_id=existing.id, origin_url=origin_url)
+                new_origin_url = origin_url
+
+            # Only hashed here, to be compared with the uploaded page or recorded with a new upload
+            content_hash = compute_content_hash(crawl_response.content)
+            # Only read when there is an uploaded page to compare with, ContentHash is outside Index_ExternalId
+            existing_content_hash = _get_content_hash(existing.id) if uploaded else None
+            # A page uploaded before ContentHash was recorded is assumed to be unchanged
+            changed = bool(existing_content_hash) and existing_content_hash != content_hash
 
-            if not S3.does_object_exist(bucket=_UPLOAD_BUCKET, key=existing.id):
-                # The data is in DB, but the S3 file does not exist
+            uploaded_datetime = None
+            if not uploaded or changed:
+                # The data is in DB, but the S3 file does not exist or is outdated
                 # The previous run might have failed, re-upload the file to S3
                 logging.info(f'Uploading file to "{_UPLOAD_BUCKET}/{existing.id}"...')
-                S3.upload_file_obj(BytesIO(content.encode('utf-8')), _UPLOAD_BUCKET, existing.id)
+                S3.upload_gzip_bytes(crawl_response.compressed_content, _UPLOAD_BUCKET, existing.id)
                 logging.info(f'Uploaded file to "{_UPLOAD_BUCKET}/{existing.id}"')
+                uploaded_datetime = datetime.now()
+            else:
+                logging.info(f'The page of JobPosting [{existing.id}] is unchanged, skipping the upload')
 
-            return
+            # Recorded with a new upload, or for a page uploaded before ContentHash was recorded
+            new_content_hash = content_hash if uploaded_datetime or not existing_content_hash else None
+
+            if new_origin_url or uploaded_datetime or new_content_hash:
+                update_job_posting_download_state(
+                    job_posting_id=existing.id,
+                    origin_url=new_origin_url,
+                    uploaded_datetime=uploaded_datetime,
+                    content_hash=new_content_hash
+                )
+
+            # Records created before the external ID lookup existed are backfilled here
+            put_job_posting_external_id(external_id=external_id, job_posting_id=existing.id)
+
+            if not uploaded_datetime:
+                return '', False
+
+            # A new or changed page is parsed again, an unchanged result is not written
+            parsed_info = _parse_content(crawl_response, existing.id)
+            if parsed_info is None:
+                return existing.id, False
+
+            update_job_posting_from_parsed_info(job_posting_id=existing.id, skip_unchanged=True, parsed_hash=compute_parsed_hash(parsed_info), **parsed_info)
+            return existing.id, True
 
         logging.info(f'Creating new JobPosting...')
 
+        # Upload first, so the record is created with its upload status in a single write
+        file_key = str(uuid.uuid4())
+        logging.info(f'Uploading file to "{_UPLOAD_BUCKET}/{file_key}"...')
+        S3.upload_gzip_bytes(crawl_response.compressed_content, _UPLOAD_BUCKET, file_key)
+        logging.info(f'Uploaded file to "{_UPLOAD_BUCKET}/{file_key}"')
+
+        # The parsed fields are written with the record, in the same put
+        parsed_info = _parse_content(crawl_response, file_key)
+        if parsed_info is not None:
+            parsed_info['parsed_hash'] = compute_parsed_hash(parsed_info)
+
         job_posting = create_job_posting(
+            id=file_key,
             source=source,
             external_id=external_id,
             url=_prepend_netloc_to_relative_url(final_url),
             origin_url=origin_url,
+            uploaded_datetime=datetime.now(),
+            **(parsed_info or {})
         )
 
-        file_key = job_posting.id
-        logging.info(f'Uploading file to "{_UPLOAD_BUCKET}/{file_key}"...')
-        S3.upload_file_obj(BytesIO(content.encode('utf-8')), _UPLOAD_BUCKET, file_key)
-        logging.info(f'Uploaded file to "{_UPLOAD_BUCKET}/{file_key}"')
+        put_job_posting_external_id(external_id=external_id, job_posting_id=job_posting.id)
 
         logging.info(f'Created JobPosting record {job_posting.id}')
-        return file_key
+        return file_key, parsed_info is not None
 
     except Exception as ex:
         logging.error('Error processing the downloaded content')
         logging.exception(ex)
         raise RetryableException(ex)
 
+def _get_content_hash(job_posting_id: str) -> str:
+    job_posting = get_job_posting(job_posting_id, fields=['content_hash'])
+    return job_posting.content_hash if job_posting else None
+
+def _parse_content(crawl_response: CrawlResponse, file_name: str) -> dict:
+    """
+    Parse the page in memory when _PARSE is on. Returns None when the page is left to IndeedJobParserFunction,
+    including when parsing fails here, so that the parser retries it
+    """
+    if not _PARSE:
+        return None
+
+    try:
+        return parse_job_posting(file=crawl_response.content, file_name=file_name)
+    except Exception as ex:
+        logging.warning(f'Parsing [{file_name}] failed with {ex!r}, leaving it to the parser')
+        return None
+
 def _parse_external_id(url: str) -> str:
     parsed_url = urlparse(url)
     queries = parse_qs(parsed_url.query)
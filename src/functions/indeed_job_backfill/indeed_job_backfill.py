@@ -0,0 +1,208 @@
+"""
+Re-parse the raw job pages in the Indeed job posting bucket and update the JobPosting records.
+
+Locally, against a moto server or MinIO (run from src/):
+
+    AWS_ENDPOINT_URL=http://localhost:5000 INDEED_JOB_POSTING_S3_BUCKET=... JOB_POSTING_TABLE=... \
+        python -m functions.indeed_job_backfill.indeed_job_backfill --checkpoint-file backfill.json
+"""
+import argparse
+import json
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from aws.s3 import S3
+from config import BUCKET_INDEED_JOB_POSTING_ENV_KEY
+from models.job_posting import (compute_parsed_hash, list_job_postings,
+                                update_job_posting_from_parsed_info)
+from parsers.indeed_job_posting import parse_job_posting
+
+_BUCKET = os.environ[BUCKET_INDEED_JOB_POSTING_ENV_KEY]
+
+_CHUNK_SIZE = 100
+_DOWNLOAD_MAX_WORKERS = 16
+_UPDATE_MAX_WORKERS = 8
+# Stop taking new chunks when the Lambda function has less time left than this
+_REMAINING_TIME_MARGIN_MILLIS = 60 * 1000
+
+logging.getLogger().setLevel(logging.INFO)
+
+def lambda_handler(event, context):
+    # Input: {"start_after": "00007cb1-ff0e-467e-9e5e-ee59433ee89f", "failed_keys": [...]}
+    # Output: {"last_key": "...", "done": false, "failed_keys": [...]}, invoke again with "start_after" set to
+    # "last_key" and the "failed_keys" until done. The failed keys are processed again first.
+
+    logging.info('Entering Indeed Job Backfill lambda_handler')
+
+    def should_stop() -> bool:
+        return context.get_remaining_time_in_millis() < _REMAINING_TIME_MARGIN_MILLIS
+
+    # Lambda does not provide /dev/shm, so the pages are parsed in-process
+    last_key, done, failed_keys = backfill(
+        start_after=event.get('start_after'),
+        retry_keys=event.get('failed_keys'),
+        parse_workers=0,
+        should_stop=should_stop
+    )
+
+    return {
+        'last_key': last_key,
+        'done': done,
+        'failed_keys': failed_keys
+    }
+
+def backfill(start_after: str = None, retry_keys: list[str] = None, parse_workers: int = None, checkpoint=None, should_stop=None) -> tuple[str, bool, list[str]]:
+    """
+    Re-parse the objects listed after start_after, chunk by chunk.
+
+    An object which fails to download, parse or update does not hold back the others. Its key is returned
+    with the failed keys, and passed to the checkpoint, so that the next run processes it again.
+
+    :param start_after: the last key of a previous run, the listing resumes after it
+    :param retry_keys: the failed keys of a previous run, processed before the listing
+    :param parse_workers: the size of the process pool for parsing, 0 to parse in-process, None for the CPU count
+    :param checkpoint: called with the last key and the failed keys so far, once a chunk is written
+    :param should_stop: called before each chunk, returns True to stop early
+    :return: the last listed key, whether the whole bucket has been listed, and the keys which failed
+    """
+    last_key = start_after
+    retry_keys = list(retry_keys or [])
+    failed_keys = []
+    processed = 0
+
+    executor = ProcessPoolExecutor(max_workers=parse_workers) if parse_workers != 0 else None
+    try:
+        while retry_keys:
+            if should_stop and should_stop():
+                logging.info(f'Stopping after {processed} objects, {len(retry_keys)} failed objects left to retry')
+                return last_key, False, failed_keys + retry_keys
+
+            keys, retry_keys = retry_keys[:_CHUNK_SIZE], retry_keys[_CHUNK_SIZE:]
+            failed_keys += _process_chunk(keys, executor)
+
+            processed += len(keys)
+            if checkpoint:
+                checkpoint(last_key, failed_keys + retry_keys)
+
+        for page in S3.iter_object_keys(bucket=_BUCKET, start_after=start_after):
+            for i in range(0, len(page), _CHUNK_SIZE):
+                if should_stop and should_stop():
+                    logging.info(f'Stopping after {processed} objects, last key [{last_key}]')
+                    return last_key, False, failed_keys
+
+                keys = page[i:i + _CHUNK_SIZE]
+                failed_keys += _process_chunk(keys, executor)
+
+                processed += len(keys)
+                last_key = keys[-1]
+                if checkpoint:
+                    checkpoint(last_key, failed_keys)
+    finally:
+        if executor:
+            executor.shutdown()
+
+    logging.info(f'Backfill completed, processed {processed} objects')
+    if failed_keys:
+        logging.warning(f'{len(failed_keys)} objects failed, to be retried: {failed_keys}')
+    return last_key, True, failed_keys
+
+def _process_chunk(keys: list[str], executor: ProcessPoolExecutor = None) -> list[str]:
+    """
+    Returns the keys which failed to download, parse or update
+    """
+    with ThreadPoolExecutor(max_workers=_DOWNLOAD_MAX_WORKERS) as download_executor:
+        downloads = list(download_executor.map(_download, keys))
+
+    files = {key: file for key, file in downloads if file is not None}
+    failed_keys = [key for key, file in downloads if file is None]
+
+    if executor:
+        results = list(executor.map(_parse, list(files), list(files.values())))
+    else:
+        results = [_parse(key, file) for key, file in files.items()]
+
+    parsed_by_key = {key: parsed for key, parsed in results if parsed}
+    failed_keys += [key for key, parsed in results if not parsed]
+
+    # Only the hashes are loaded to find the changed records, the descriptions are not fetched
+    changed = []
+    unchanged = 0
+    for job_posting in list_job_postings(list(parsed_by_key), fields=['parsed_hash']):
+        parsed = parsed_by_key.pop(job_posting.id)
+        parsed_hash = compute_parsed_hash(parsed)
+        if job_posting.parsed_hash == parsed_hash:
+            unchanged += 1
+        else:
+            changed.append((job_posting.id, parsed, parsed_hash))
+
+    # Updated attribute by attribute rather than put as whole items, so the changes made to the
+    # other attributes meanwhile are kept
+    with ThreadPoolExecutor(max_workers=_UPDATE_MAX_WORKERS) as update_executor:
+        updated = list(update_executor.map(lambda x: _update(*x), changed))
+    failed_keys += [job_posting_id for (job_posting_id, _, _), is_updated in zip(changed, updated) if not is_updated]
+
+    if unchanged:
+        logging.info(f'Skipped {unchanged} unchanged JobPosting records')
+
+    if parsed_by_key:
+        logging.warning(f'No JobPosting record for objects {list(parsed_by_key)}, skipping')
+
+    return failed_keys
+
+def _download(key: str) -> tuple[str, str]:
+    # Errors are logged rather than raised to keep the chunk going, the key is returned as failed
+    try:
+        return key, S3.download_file_str(_BUCKET, key)
+    except Exception as ex:
+        logging.warning(f'Downloading [{key}] failed with {ex!r}')
+        return key, None
+
+def _update(job_posting_id: str, parsed: dict, parsed_hash: str) -> bool:
+    try:
+        update_job_posting_from_parsed_info(job_posting_id, parsed_hash=parsed_hash, **parsed)
+    except Exception as ex:
+        logging.warning(f'Updating JobPosting [{job_posting_id}] failed with {ex!r}')
+        return False
+    return True
+
+def _parse(key: str, file: str) -> tuple[str, dict]:
+    # Runs in the worker processes, errors are logged rather than raised to keep the chunk going
+    try:
+        return key, parse_job_posting(file=file, file_name=key)
+    except Exception as ex:
+        logging.warning(f'Parsing [{key}] failed with {ex!r}')
+        return key, None
+
+def _load_checkpoint(path: str) -> tuple[str, list[str]]:
+    if not os.path.exists(path):
+        return None, []
+    with open(path) as f:
+        checkpoint = json.load(f)
+    return checkpoint.get('last_key'), checkpoint.get('failed_keys', [])
+
+def _save_checkpoint(path: str, last_key: str, failed_keys: list[str]) -> None:
+    # Write then rename, so an interrupted run never leaves a truncated checkpoint
+    with open(f'{path}.tmp', 'w') as f:
+        json.dump({'last_key': last_key, 'failed_keys': failed_keys}, f)
+    os.replace(f'{path}.tmp', path)
+
+def main():
+    parser = argparse.ArgumentParser(description='Re-parse the raw Indeed job pages into JobPosting records')
+    parser.add_argument('--checkpoint-file', help='JSON file keeping the last processed key and the failed keys, to resume from')
+    parser.add_argument('--start-after', help='Only process the object keys after this one')
+    parser.add_argument('--workers', type=int, default=None, help='Number of parsing processes, 0 to parse in-process')
+    args = parser.parse_args()
+
+    start_after = args.start_after
+    retry_keys = []
+    if not start_after and args.checkpoint_file:
+        start_after, retry_keys = _load_checkpoint(args.checkpoint_file)
+        logging.info(f'Resuming after [{start_after}], retrying {len(retry_keys)} failed objects first')
+
+    checkpoint = (lambda key, failed_keys: _save_checkpoint(args.checkpoint_file, key, failed_keys)) if args.checkpoint_file else None
+
+    backfill(start_after=start_after, retry_keys=retry_keys, parse_workers=args.workers, checkpoint=checkpoint)
+
+if __name__ == '__main__':
+    main()
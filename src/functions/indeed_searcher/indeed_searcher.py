@@ -1,44 +1,191 @@
 import logging
-from urllib.parse import urlparse, urlunparse
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, urlencode, urlparse, urlunparse
 
 from bs4 import BeautifulSoup
 
-from exceptions.exceptions import MalFormedMessageException
+from aws.client_factory import warm_up
+from exceptions.exceptions import MalFormedMessageException, RetryableException
 from crawler.proxies_manager import ProxiesManager
+from models.job_posting_external_id import list_existing_external_ids
+from models.search_watermark import get_search_watermark, put_search_watermark
 
+_SEARCH_URL = 'https://ca.indeed.com/jobs'
+_PAGE_SIZE = 50
+_MAX_PAGES = 10
+_SEARCH_MAX_WORKERS = 4
+# Share of the organic results of a page already in the watermark for the search to stop at that page.
+# 1.0 stops at a page made only of known job postings, a lower share stops earlier at the risk of
+# missing the job postings listed out of date order.
+_WATERMARK_STOP_SHARE = 1.0
+# Sponsored results link to /pagead/clk, organic ones to /rc/clk
+_SPONSORED_PATH_PREFIX = '/pagead/'
 
 logging.getLogger().setLevel(logging.INFO)
 
+warm_up('dynamodb')
+
 def lambda_handler(event, context):
-    # Input: {"url":"https://ca.indeed.com/jobs?q=data+analyst&sort=date&limit=50"}
+    # Input: {"queries":[{"q":"data analyst","l":"Vancouver, BC"}, ...], "pages":3}
+    # or a single search page: {"url":"https://ca.indeed.com/jobs?q=data+analyst&sort=date&limit=50"}
     logging.info("Entering Indeed Searcher lambda_handler")
 
-    url = _parse_event(event)
-    logging.info(f'Parsed url {url}')
+    search_urls = _parse_event(event)
+    logging.info(f'Parsed {len(search_urls)} searches')
 
-    content, _ = ProxiesManager().crawl(url)
+    # The queries are crawled concurrently, the pages of a query one after the other, to stop at the first known page
+    with ThreadPoolExecutor(max_workers=min(_SEARCH_MAX_WORKERS, len(search_urls))) as executor:
+        results = list(executor.map(lambda pages: _search(pages, context), search_urls))
 
-    soup = BeautifulSoup(content, 'html.parser')
-    urls = [_parse_url(x['href']) for x in soup.find_all('a', class_='jcs-JobTitle')]
+    if all(x is None for x in results):
+        raise RetryableException(f'Every search failed for {event}')
 
-    # TODO: check if the URL already exists
+    urls = _deduplicate_urls([url for x in results if x for url in x])
 
     result = {
         "job_postings": [{"url": url} for url in urls]
     }
     return result
 
-def _parse_event(event) -> str:
+def _parse_event(event) -> list[list[str]]:
     """
-    Parse the event
+    Parse the event into the URLs of the result pages of each search
     """
-    if 'url' not in event:
+    if 'url' in event:
+        return [[event['url']]]
+
+    if not isinstance(event.get('queries'), list) or not event['queries']:
         raise MalFormedMessageException(f'Message {event} is malformed')
 
-    return event['url']
+    pages = event.get('pages', 1)
+    if not isinstance(pages, int) or not 1 <= pages <= _MAX_PAGES:
+        raise MalFormedMessageException(f'Message {event} is malformed, pages must be between 1 and {_MAX_PAGES}')
+
+    search_urls = []
+    for query in event['queries']:
+        if not isinstance(query, dict) or not query.get('q'):
+            raise MalFormedMessageException(f'Message {event} is malformed')
+        search_urls.append([_build_search_url(query['q'], query.get('l'), page) for page in range(pages)])
+
+    return search_urls
+
+def _build_search_url(q: str, l: str = None, page: int = 0) -> str:
+    params = {'q': q}
+    if l:
+        params['l'] = l
+    params.update({'sort': 'date', 'limit': _PAGE_SIZE})
+    if page:
+        params['start'] = page * _PAGE_SIZE
+    return f'{_SEARCH_URL}?{urlencode(params)}'
+
+def _search(page_urls: list[str], context=None) -> list[str]:
+    """
+    Crawl the result pages of a search in order, and return the URLs of the job postings which do not exist yet.
+    The organic results are sorted by date, so the search stops at the page whose organic results were seen by
+    its previous run (the watermark), or at the first page without any new job posting. Sponsored results are
+    placed regardless of their date, they are collected but do not stop the search.
+    Returns None when the first page cannot be crawled.
+    """
+    # The first page identifies the search
+    search_key = page_urls[0]
+    watermark_external_ids = _get_watermark(search_key)
+    watermark = set(watermark_external_ids)
+
+    new_urls = []
+    seen_external_ids = []
+    failed = False
+
+    for page, page_url in enumerate(page_urls):
+        try:
+            urls = _crawl_search_page(page_url, context)
+        except Exception as ex:
+            logging.warning(f'Crawling search page "{page_url}" failed with {ex!r}')
+            if not page:
+                return None
+            failed = True
+            break
+
+        organic_external_ids = [x for x in (_parse_external_id(url) for url in urls if not _is_sponsored(url)) if x]
+        seen_external_ids.extend(organic_external_ids)
+
+        unseen_urls = [url for url in urls if _parse_external_id(url) not in watermark]
+        page_new_urls = _filter_existing_urls(unseen_urls)
+        new_urls.extend(page_new_urls)
+
+        known_count = sum(1 for x in organic_external_ids if x in watermark)
+        if organic_external_ids and known_count >= _WATERMARK_STOP_SHARE * len(organic_external_ids):
+            logging.info(f'Search page "{page_url}" reached the watermark, stopping the search')
+            break
+
+        if not page_new_urls:
+            logging.info(f'No new job posting in search page "{page_url}", stopping the search')
+            break
+
+    if failed:
+        # The job postings of the pages which were not crawled would be skipped by the next run
+        logging.warning(f'Keeping the watermark of search "{search_key}", a search page failed')
+    else:
+        _put_watermark(search_key, list(dict.fromkeys(seen_external_ids + watermark_external_ids)))
+
+    return new_urls
+
+def _get_watermark(search_key: str) -> list[str]:
+    try:
+        return get_search_watermark(search_key)
+    except Exception as ex:
+        # Without the watermark, the search still stops at the first page without any new job posting
+        logging.warning(f'Getting the watermark of search "{search_key}" failed with {ex!r}')
+        return []
+
+def _put_watermark(search_key: str, recent_external_ids: list[str]) -> None:
+    if not recent_external_ids:
+        return
+
+    try:
+        put_search_watermark(search_key, recent_external_ids)
+    except Exception as ex:
+        logging.warning(f'Saving the watermark of search "{search_key}" failed with {ex!r}')
+
+def _crawl_search_page(url: str, context=None) -> list[str]:
+    crawl_response = ProxiesManager().crawl(url, context)
+
+    soup = BeautifulSoup(crawl_response.content, 'html.parser')
+    return [_parse_url(x['href']) for x in soup.find_all('a', class_='jcs-JobTitle')]
 
 def _parse_url(url: str):
     uu = list(urlparse(url))
     uu[0] = 'https'  # scheme
     uu[1] = 'ca.indeed.com'  # netloc, the link in the search results page are all relative
     return urlunparse(uu)
+
+def _deduplicate_urls(urls: list[str]) -> list[str]:
+    """
+    A job posting found by several searches is kept once. Its links might differ in their tracking parameters,
+    so the URLs are told apart by their external ID when they have one.
+    """
+    unique_urls = {}
+    for url in urls:
+        unique_urls.setdefault(_parse_external_id(url) or url, url)
+    return list(unique_urls.values())
+
+def _filter_existing_urls(urls: list[str]) -> list[str]:
+    """
+    Drop the URLs whose external ID already has a JobPosting record.
+    URLs without an external ID are kept, the downloader will resolve them.
+    """
+    if not urls:
+        return []
+
+    existing_external_ids = list_existing_external_ids([_parse_external_id(url) for url in urls])
+    logging.info(f'{len(existing_external_ids)} of {len(urls)} job postings already exist')
+
+    return [url for url in urls if _parse_external_id(url) not in existing_external_ids]
+
+def _is_sponsored(url: str) -> bool:
+    return urlparse(url).path.startswith(_SPONSORED_PATH_PREFIX)
+
+def _parse_external_id(url: str) -> str:
+    queries = parse_qs(urlparse(url).query)
+    if 'jk' in queries:
+        return queries['jk'][0]
+    return ''
@@ -2,6 +2,7 @@ import logging
 import os
 
 from aws import SNS
+from aws.client_factory import warm_up
 from config import STATE_MACHINE_EXECUTION_NOTIFICATION_TOPIC
 
 
@@ -9,6 +10,8 @@ logging.getLogger().setLevel(logging.INFO)
 
 _NOTIFICATION_SNS_TOPIC_ARN = os.environ[STATE_MACHINE_EXECUTION_NOTIFICATION_TOPIC]
 
+warm_up('sns')
+
 def lambda_handler(event, context):
     # Input: {"status": "FAILED", "region": "us-west-2", "executionArn": "arn:aws:states:us-west-2:xxxxxxxx:execution:IndeedJobStateMachine-FcPDQL2GxuEV:37f601e5-1dc8-4b29-82e0-3b35059c7f31"}
 
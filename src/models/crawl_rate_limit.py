@@ -0,0 +1,39 @@
+""" Request counters shared by every crawler, one item per rate limit key and second """
+import os
+
+from aws.dynamo_db import DynamoDB
+from boto3.dynamodb.types import TypeSerializer
+from botocore.exceptions import ClientError
+from config import DYNAMODB_TABLE_CRAWL_RATE_LIMIT_ENV_KEY
+
+_CRAWL_RATE_LIMIT_TABLE_NAME = os.environ[DYNAMODB_TABLE_CRAWL_RATE_LIMIT_ENV_KEY]
+
+# Counters are removed by the DynamoDB TTL once their second is long gone
+_COUNTER_TTL_SECONDS = 120
+
+
+def acquire_crawl_token(key: str, epoch_second: int, limit: int) -> bool:
+    """
+    Counts one request for the key in the given second, unless the counter has already reached the limit.
+    Returns whether the request was counted.
+    """
+    serializer = TypeSerializer()
+
+    try:
+        DynamoDB.update_item(
+            table_name=_CRAWL_RATE_LIMIT_TABLE_NAME,
+            key={'Id': serializer.serialize(f'{key}#{epoch_second}')},
+            update_expression='ADD RequestCount :inc SET ExpiresAt = :expires_at',
+            expression_attribute_values={
+                ':inc': serializer.serialize(1),
+                ':limit': serializer.serialize(limit),
+                ':expires_at': serializer.serialize(epoch_second + _COUNTER_TTL_SECONDS)
+            },
+            condition_expression='attribute_not_exists(RequestCount) OR RequestCount < :limit'
+        )
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+            return False
+        raise e
+
+    return True
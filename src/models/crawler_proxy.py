@@ -1,5 +1,6 @@
+import logging
 import os
-from datetime import datetime
+from datetime import datetime, timedelta
 
 from aws.dynamo_db import DynamoDB
 from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
@@ -7,6 +8,37 @@ from config import DYNAMODB_TABLE_CRAWLER_PROXY_ENV_KEY
 
 _CRAWLER_PROXY_TABLE_NAME = os.environ[DYNAMODB_TABLE_CRAWLER_PROXY_ENV_KEY]
 
+# Records deactivated before ReactivateEpochSecond existed were benched for this long
+_LEGACY_DEACTIVATED_WAIT_TIME = timedelta(hours=12)
+
+# Every proxy is in this partition of Index_Availability, sorted by ReactivateEpochSecond.
+# The proxy table is small, a single partition is far from the per-partition throughput limits.
+_AVAILABILITY_INDEX_NAME = 'Index_Availability'
+_AVAILABILITY_PARTITION = 'ALL'
+
+# Set once the records missing from Index_Availability have been added to it in this container
+_legacy_crawler_proxies_migrated = False
+
+# Outcomes of a call to a proxy, each one is counted in the attribute f'{outcome}Count'
+OUTCOME_SUCCESS = 'Success'
+OUTCOME_CAPTCHA = 'Captcha'
+OUTCOME_EMPTY_CONTENT = 'EmptyContent'
+OUTCOME_STATUS_CODE_ERROR = 'StatusCodeError'
+OUTCOME_MALFORMED_RESPONSE = 'MalformedResponse'
+OUTCOME_INVOKE_ERROR = 'InvokeError'
+# Not answered after HEDGE_AFTER_SECONDS, the crawl was sent to another proxy as well
+OUTCOME_HEDGED = 'Hedged'
+
+OUTCOMES = [
+    OUTCOME_SUCCESS,
+    OUTCOME_CAPTCHA,
+    OUTCOME_EMPTY_CONTENT,
+    OUTCOME_STATUS_CODE_ERROR,
+    OUTCOME_MALFORMED_RESPONSE,
+    OUTCOME_INVOKE_ERROR,
+    OUTCOME_HEDGED,
+]
+
 class CrawlerProxy():
     """ Data model of crawler proxy """
     id: str
@@ -14,6 +46,10 @@ class CrawlerProxy():
     arn: str
     deactivated_epoch_second: int
     deactivated_count: int
+    reactivate_epoch_second: int
+    failure_streak: int  # consecutive deactivations, cleared once the proxy succeeds again
+    outcome_counts: dict[str, int]
+    total_latency_millis: int
 
     def __init__(self, dynamo_object):
         deserializer = TypeDeserializer()
@@ -23,40 +59,112 @@ class CrawlerProxy():
         self.arn = deserializer.deserialize(dynamo_object.get('Arn'))
         self.deactivated_epoch_second = int(deserializer.deserialize(dynamo_object.get('DeactivatedEpochSecond')))
         self.deactivated_count = int(deserializer.deserialize(dynamo_object.get('DeactivatedCount')))
+        self.failure_streak = int(deserializer.deserialize(dynamo_object.get('FailureStreak', {'N': '0'})))
+        if 'ReactivateEpochSecond' in dynamo_object:
+            self.reactivate_epoch_second = int(deserializer.deserialize(dynamo_object['ReactivateEpochSecond']))
+        else:
+            self.reactivate_epoch_second = self.deactivated_epoch_second + int(_LEGACY_DEACTIVATED_WAIT_TIME.total_seconds())
+        self.outcome_counts = {
+            outcome: int(deserializer.deserialize(dynamo_object.get(f'{outcome}Count', {'N': '0'})))
+            for outcome in OUTCOMES
+        }
+        self.total_latency_millis = int(deserializer.deserialize(dynamo_object.get('TotalLatencyMillis', {'N': '0'})))
 
 
 def get_crawler_proxy(proxy_id: str):
     ddb_item = DynamoDB.get_item(table_name=_CRAWLER_PROXY_TABLE_NAME, key_attr={'Id': proxy_id})
     return CrawlerProxy(ddb_item)
 
-def list_active_crawler_proxy(last_deactivate_datetime: datetime):
+def list_active_crawler_proxy(now: datetime):
+    """
+    List the proxies whose cooldown is over at the given time, with a range query on Index_Availability
+    """
     serializer = TypeSerializer()
 
-    filter_expression = 'DeactivatedEpochSecond < :last_deactivate'
-    attribute_values = {':last_deactivate': serializer.serialize(int(last_deactivate_datetime.timestamp()))}
+    ddb_items = DynamoDB.query(
+        table_name=_CRAWLER_PROXY_TABLE_NAME,
+        index_name=_AVAILABILITY_INDEX_NAME,
+        key_condition_expression='AvailabilityPartition = :partition AND ReactivateEpochSecond < :now',
+        expression_attribute_values={
+            ':partition': serializer.serialize(_AVAILABILITY_PARTITION),
+            ':now': serializer.serialize(int(now.timestamp()))
+        }
+    )
+
+    crawler_proxies = [CrawlerProxy(ddb_item) for ddb_item in ddb_items]
+
+    if not crawler_proxies and not _legacy_crawler_proxies_migrated:
+        # Records which are not in the index yet can only be found by a scan
+        crawler_proxies = _list_active_legacy_crawler_proxy(now)
+
+    return crawler_proxies
+
+def _list_active_legacy_crawler_proxy(now: datetime):
+    """
+    Scan the proxies missing from Index_Availability, adding them to it, and return the active ones.
+    Done once per container, an empty index afterwards means that every proxy is cooling down.
+    Only needed until every record has AvailabilityPartition and ReactivateEpochSecond, new records
+    should be created with both.
+    """
+    global _legacy_crawler_proxies_migrated
 
     ddb_items = DynamoDB.scan(
         table_name=_CRAWLER_PROXY_TABLE_NAME,
-        filter_expression=filter_expression,
-        expression_attribute_values=attribute_values
+        filter_expression='attribute_not_exists(AvailabilityPartition) OR attribute_not_exists(ReactivateEpochSecond)'
     )
 
-    return [CrawlerProxy(ddb_item) for ddb_item in ddb_items]
+    crawler_proxies = []
+    for ddb_item in ddb_items:
+        crawler_proxy = CrawlerProxy(ddb_item)
+
+        logging.info(f'Adding proxy [{crawler_proxy.id}] to {_AVAILABILITY_INDEX_NAME}')
+        _set_crawler_proxy_availability(crawler_proxy.id, crawler_proxy.reactivate_epoch_second)
+
+        if crawler_proxy.reactivate_epoch_second < int(now.timestamp()):
+            crawler_proxies.append(crawler_proxy)
+
+    _legacy_crawler_proxies_migrated = True
+    return crawler_proxies
+
+def _set_crawler_proxy_availability(proxy_id: str, reactivate_epoch_second: int) -> None:
+    serializer = TypeSerializer()
+
+    DynamoDB.update_item(
+        table_name=_CRAWLER_PROXY_TABLE_NAME,
+        key={'Id': serializer.serialize(proxy_id)},
+        update_expression=(
+            'SET '
+            'AvailabilityPartition = :partition, '
+            'ReactivateEpochSecond = if_not_exists(ReactivateEpochSecond, :reactivateEpochSecond)'
+        ),
+        expression_attribute_values={
+            ':proxy_id': serializer.serialize(proxy_id),
+            ':partition': serializer.serialize(_AVAILABILITY_PARTITION),
+            ':reactivateEpochSecond': serializer.serialize(reactivate_epoch_second)
+        },
+        condition_expression='Id = :proxy_id' # Only update when the Id exists
+    )
 
-def deactivate_crawler_proxy(proxy_id) -> None:
+def deactivate_crawler_proxy(proxy_id, reactivate_datetime: datetime) -> None:
     serializer = TypeSerializer()
 
     expression = (
         'SET '
         'DeactivatedEpochSecond = :deactivatedEpochSecond, '
+        'ReactivateEpochSecond = :reactivateEpochSecond, '
+        'AvailabilityPartition = :partition, '
         'DeactivatedCount = DeactivatedCount + :inc, '
+        'FailureStreak = if_not_exists(FailureStreak, :zero) + :inc, '
         'UpdatedDatetime = :now'
     )
 
     attribute_values = {
         ':proxy_id': serializer.serialize(proxy_id),
         ':deactivatedEpochSecond': serializer.serialize(int(datetime.now().timestamp())),
+        ':reactivateEpochSecond': serializer.serialize(int(reactivate_datetime.timestamp())),
+        ':partition': serializer.serialize(_AVAILABILITY_PARTITION),
         ':inc': serializer.serialize(1),
+        ':zero': serializer.serialize(0),
         ':now': serializer.serialize(datetime.now().isoformat())
     }
 
@@ -67,3 +175,35 @@ def deactivate_crawler_proxy(proxy_id) -> None:
         expression_attribute_values=attribute_values,
         condition_expression='Id = :proxy_id' # Only update when the Id exists
     )
+
+def record_crawler_proxy_stats(proxy_id: str, outcome_counts: dict[str, int], latency_millis: int, reset_failure_streak: bool = False) -> None:
+    """
+    Atomically add the outcome counts and the latency to the counters of the proxy
+    """
+    serializer = TypeSerializer()
+
+    attribute_values = {
+        ':proxy_id': serializer.serialize(proxy_id),
+        ':latency': serializer.serialize(latency_millis),
+        ':now': serializer.serialize(datetime.now().isoformat())
+    }
+
+    add_actions = ['TotalLatencyMillis :latency']
+    for outcome, count in outcome_counts.items():
+        if outcome not in OUTCOMES:
+            raise ValueError(f'Unknown outcome {outcome}')
+        add_actions.append(f'{outcome}Count :{outcome}')
+        attribute_values[f':{outcome}'] = serializer.serialize(count)
+
+    set_actions = ['UpdatedDatetime = :now']
+    if reset_failure_streak:
+        set_actions.append('FailureStreak = :zero')
+        attribute_values[':zero'] = serializer.serialize(0)
+
+    DynamoDB.update_item(
+        table_name=_CRAWLER_PROXY_TABLE_NAME,
+        key={'Id': serializer.serialize(proxy_id)},
+        update_expression=f'ADD {", ".join(add_actions)} SET {", ".join(set_actions)}',
+        expression_attribute_values=attribute_values,
+        condition_expression='Id = :proxy_id' # Only update when the Id exists
+    )
@@ -1,19 +1,94 @@
 from __future__ import annotations
 import logging
 
+import gzip
+import hashlib
 import os
+import re
 import uuid
-from datetime import datetime
+from datetime import datetime, timedelta
 
 from aws.dynamo_db import DynamoDB
+from aws.s3 import S3
 from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
-from config import DYNAMODB_TABLE_JOB_POSTING_ENV_KEY
+from botocore.exceptions import ClientError
+from config import (BUCKET_JOB_DESCRIPTION_ENV_KEY,
+                    DYNAMODB_TABLE_JOB_POSTING_ENV_KEY, GZIP_COMPRESS_LEVEL,
+                    JOB_DESCRIPTION_OFFLOAD_ENV_KEY,
+                    JOB_DESCRIPTION_OFFLOAD_THRESHOLD_BYTES_ENV_KEY)
 
 _JOB_POSTING_TABLE_NAME = os.environ[DYNAMODB_TABLE_JOB_POSTING_ENV_KEY]
 
+_OFFLOAD_COMPRESS = 'compress'  # gzip-compressed, in the binary attribute f'{attribute}Compressed'
+_OFFLOAD_S3 = 's3'  # in an S3 object, the key in the attribute f'{attribute}S3Key'
+_OFFLOAD_NONE = 'none'
+
+# Off unless enabled, e.g. in template.yaml, every reader of the table must know the offloaded attributes first
+_OFFLOAD = os.environ.get(JOB_DESCRIPTION_OFFLOAD_ENV_KEY, _OFFLOAD_NONE)
+# DynamoDB charges reads per 4 KB, and an item is limited to 400 KB
+_OFFLOAD_THRESHOLD_BYTES = int(os.environ.get(JOB_DESCRIPTION_OFFLOAD_THRESHOLD_BYTES_ENV_KEY, '8192'))
+_OFFLOAD_BUCKET = os.environ.get(BUCKET_JOB_DESCRIPTION_ENV_KEY)
+
+if _OFFLOAD == _OFFLOAD_S3 and not _OFFLOAD_BUCKET:
+    raise ValueError(f'{BUCKET_JOB_DESCRIPTION_ENV_KEY} is required by the {_OFFLOAD_S3} offload')
+
+
+_SERIALIZER = TypeSerializer()
+_DESERIALIZER = TypeDeserializer()
+
+_STRING = 'S'
+_LARGE_STRING = 'LARGE_S'  # offloaded out of the attribute above _OFFLOAD_THRESHOLD_BYTES
+_DATETIME = 'DATETIME'  # stored as an ISO 8601 string
+
+# (field, DynamoDB attribute, type), drives the (de)serialization of JobPosting
+_FIELDS = (
+    ('id', 'Id', _STRING),
+    ('external_id', 'ExternalId', _STRING),
+    ('url', 'Url', _STRING),
+    ('origin_url', 'OriginUrl', _STRING),
+    ('source', 'Source', _STRING),
+    ('title', 'Title', _STRING),
+    ('company_name', 'CompanyName', _STRING),
+    ('location', 'LocationString', _STRING),
+    ('job_description', 'JobDescription', _LARGE_STRING),
+    ('posted_datetime', 'PostedDatetime', _DATETIME),
+    ('created_datetime', 'CreatedDatetime', _DATETIME),
+    ('updated_datetime', 'UpdatedDatetime', _DATETIME),
+    ('uploaded_datetime', 'UploadedDatetime', _DATETIME),  # when the raw page was uploaded to S3
+    ('content_hash', 'ContentHash', _STRING),  # of the raw page in S3, see compute_content_hash()
+    ('parsed_hash', 'ParsedHash', _STRING),  # of the parsed fields, see compute_parsed_hash()
+)
+_FIELD_NAMES = frozenset(field for field, _, _ in _FIELDS)
+_ATTRIBUTE_NAMES = {field: attribute for field, attribute, _ in _FIELDS}
+# The attributes a field can be stored in
+_FIELD_ATTRIBUTES = {
+    field: (attribute, f'{attribute}Compressed', f'{attribute}S3Key') if attribute_type is _LARGE_STRING else (attribute,)
+    for field, attribute, attribute_type in _FIELDS
+}
+
+# Fields in the projection of the indexes, see template.yaml
+_INDEX_FIELDS = {
+    'Index_ExternalId': frozenset(['id', 'external_id', 'origin_url']),
+    'Index_OriginUrl': frozenset(['id', 'origin_url']),
+    'Index_OriginUrlDownloadState': frozenset(['id', 'origin_url', 'external_id', 'uploaded_datetime']),
+}
+
+# Index_OriginUrlDownloadState is not readable while it is being created, the lookups go through
+# Index_OriginUrl until then, checking the new index again after this interval
+_ORIGIN_URL_INDEX_RETRY_INTERVAL = timedelta(minutes=5)
+_origin_url_index_unavailable_until = datetime.min
+
 
 class JobPosting():
-    """ Data model of Job Postings """
+    """
+    Data model of Job Postings.
+    A field without a value, e.g. an attribute missing from the DynamoDB item, is None.
+
+    A JobPosting loaded with a subset of its fields is partial, the other fields are fetched together
+    from the table on the first access to one of them.
+    """
+    __slots__ = tuple(field for field, _, _ in _FIELDS) + ('_partial',)
+
     id: str
     external_id: str
     url: str
@@ -27,189 +102,511 @@ class JobPosting():
     posted_datetime: datetime
     created_datetime: datetime
     updated_datetime: datetime
+    uploaded_datetime: datetime
+    content_hash: str
+    parsed_hash: str
 
     def __init__(self, **kwargs):
-        for k, v in kwargs.items():
-            self.__setattr__(k, v)
-
-    def to_dynamo_object(self) -> dict:
-        serializer = TypeSerializer()
-        ddb_item = {
-            'Id': serializer.serialize(self.id)
-            }
-
-        if hasattr(self, 'external_id') and self.external_id:
-            ddb_item['ExternalId'] = serializer.serialize(self.external_id)
-
-        if hasattr(self, 'url') and self.url:
-            ddb_item['Url'] = serializer.serialize(self.url)
-
-        if hasattr(self, 'origin_url') and self.origin_url:
-            ddb_item['OriginUrl'] = serializer.serialize(self.origin_url)
-
-        if hasattr(self, 'source') and self.source:
-            ddb_item['Source'] = serializer.serialize(self.source)
-
-        if hasattr(self, 'title') and self.title:
-            ddb_item['Title'] = serializer.serialize(self.title)
-        
-        if hasattr(self, 'company_name') and self.company_name:
-            ddb_item['company_name'] = serializer.serialize(self.company_name)
-
-        if hasattr(self, 'location') and self.location:
-            ddb_item['LocationString'] = serializer.serialize(self.location)
-
-        if hasattr(self, 'job_description') and self.job_description:
-            ddb_item['JobDescription'] = serializer.serialize(self.job_description)
-
-        if hasattr(self, 'posted_datetime') and self.posted_datetime:
-            ddb_item['PostedDatetime'] = serializer.serialize(self.posted_datetime.isoformat())
-
-        if hasattr(self, 'created_datetime') and self.created_datetime:
-            ddb_item['CreatedDatetime'] = serializer.serialize(self.created_datetime.isoformat())
-
-        if hasattr(self, 'updated_datetime') and self.updated_datetime:
-            ddb_item['UpdatedDatetime'] = serializer.serialize(self.updated_datetime.isoformat())
+        for field, _, _ in _FIELDS:
+            setattr(self, field, kwargs.pop(field, None))
+        self._partial = False
+
+        if kwargs:
+            raise TypeError(f'Unknown JobPosting fields {sorted(kwargs)}')
+
+    def __getattr__(self, name):
+        # Only called for the fields which have not been loaded, or assigned, yet
+        if name not in _FIELD_NAMES or not self._partial:
+            raise AttributeError(f"'JobPosting' object has no attribute '{name}'")
+
+        self._load_missing_fields()
+        return object.__getattribute__(self, name)
+
+    def __repr__(self) -> str:
+        # Does not trigger the fetch of a partial JobPosting
+        return f"JobPosting(id={self._get_loaded('id')!r}, external_id={self._get_loaded('external_id')!r})"
+
+    def _get_loaded(self, field: str):
+        try:
+            return object.__getattribute__(self, field)
+        except AttributeError:
+            return None
+
+    def _load_missing_fields(self) -> None:
+        missing_fields = []
+        for field, _, _ in _FIELDS:
+            try:
+                object.__getattribute__(self, field)
+            except AttributeError:
+                missing_fields.append(field)
+
+        if missing_fields:
+            self._load_fields(frozenset(missing_fields))
+        self._partial = False
+
+    def _load_fields(self, fields: frozenset[str]) -> None:
+        logging.info(f'Fetching fields {sorted(fields)} of partial JobPosting [{self.id}]')
+        projection_expression, attribute_names = _build_projection(fields)
+        ddb_item = DynamoDB.get_item(
+            table_name=_JOB_POSTING_TABLE_NAME,
+            key_attr={'Id': {'S': self.id}},
+            projection_expression=projection_expression,
+            expression_attribute_names=attribute_names
+        )
+        if ddb_item is None:
+            logging.warning(f'JobPosting [{self.id}] does not exist anymore')
+
+        self._set_fields(ddb_item or {}, fields)
+
+    def to_dynamo_object(self, offloads: list[tuple[str, bytes]] = None) -> dict:
+        """
+        Fields without a value are left out of the item.
+        A value offloaded to S3 is added to offloads, to be uploaded with _upload_offloads() once the item is written
+        """
+        ddb_item = {}
+
+        for field, attribute, attribute_type in _FIELDS:
+            value = getattr(self, field)
+            if not value:
+                continue
+
+            if attribute_type is _DATETIME:
+                ddb_item[attribute] = {'S': value.isoformat()}
+            elif attribute_type is _LARGE_STRING:
+                ddb_item.update(_serialize_large_string(self.id, attribute, value, offloads))
+            else:
+                ddb_item[attribute] = {'S': value}
 
         return ddb_item
 
-
     @classmethod
-    def from_dynamo_object(cls, dynamo_object: dict) -> JobPosting:
-        deserializer = TypeDeserializer()
-
-        kwargs = {
-            'id': deserializer.deserialize(dynamo_object.get('Id'))
-        }
-
-        kwargs['external_id'] = deserializer.deserialize(dynamo_object.get('ExternalId', {'S': ''}))
-        kwargs['url'] = deserializer.deserialize(dynamo_object.get('Url', {'S': ''}))
-        kwargs['origin_url'] = deserializer.deserialize(dynamo_object.get('OriginUrl', {'S': ''}))
-        kwargs['source'] = deserializer.deserialize(dynamo_object.get('Source', {'S': ''}))
-        kwargs['title'] = deserializer.deserialize(dynamo_object.get('Title', {'S': ''}))
-        kwargs['company_name'] = deserializer.deserialize(dynamo_object.get('CompanyName', {'S': ''}))
-        kwargs['location'] = deserializer.deserialize(dynamo_object.get('LocationString', {'S': ''}))
-        kwargs['job_description'] = deserializer.deserialize(dynamo_object.get('JobDescription', {'S': ''}))
-        kwargs['posted_datetime'] = datetime.fromisoformat(deserializer.deserialize(dynamo_object.get('PostedDatetime', {'S': '1970-01-01T00:00:00.000000'})))
-        kwargs['created_datetime'] = datetime.fromisoformat(deserializer.deserialize(dynamo_object.get('CreatedDatetime', {'S': '1970-01-01T00:00:00.000000'})))
-        kwargs['updated_datetime'] = datetime.fromisoformat(deserializer.deserialize(dynamo_object.get('UpdatedDatetime', {'S': '1970-01-01T00:00:00.000000'})))
-
-        return cls(**kwargs)
-
-def get_job_posting(job_posting_id: str) -> JobPosting:
-    ddb_item = DynamoDB.get_item(table_name=_JOB_POSTING_TABLE_NAME, key_attr={'Id': job_posting_id})
+    def from_dynamo_object(cls, dynamo_object: dict, fields: frozenset[str] = None) -> JobPosting:
+        """
+        With fields, only those fields are deserialized, and the JobPosting is partial
+        """
+        job_posting = cls.__new__(cls)
+        job_posting._partial = fields is not None and fields != _FIELD_NAMES
+        job_posting._set_fields(dynamo_object, fields)
+        return job_posting
+
+    def _set_fields(self, dynamo_object: dict, fields: frozenset[str] = None) -> None:
+        for field, attribute, attribute_type in _FIELDS:
+            if fields is not None and field not in fields:
+                continue
+
+            ddb_value = dynamo_object.get(attribute)
+            if attribute_type is _LARGE_STRING and ddb_value is None:
+                value = _deserialize_offloaded_string(dynamo_object, attribute)
+            elif ddb_value is None:
+                value = None
+            elif 'S' not in ddb_value:
+                # Not written by this model, e.g. edited by hand
+                value = _DESERIALIZER.deserialize(ddb_value)
+            elif attribute_type is _DATETIME:
+                value = datetime.fromisoformat(ddb_value['S'])
+            else:
+                value = ddb_value['S']
+
+            setattr(self, field, value)
+
+
+def get_job_posting(job_posting_id: str, fields: list[str] = None) -> JobPosting:
+    """
+    With fields, only those fields are read, the others are fetched on first access
+    """
+    fields = _normalize_fields(fields)
+    projection_expression, attribute_names = _build_projection(fields)
+
+    ddb_item = DynamoDB.get_item(
+        table_name=_JOB_POSTING_TABLE_NAME,
+        key_attr={'Id': _SERIALIZER.serialize(job_posting_id)},
+        projection_expression=projection_expression,
+        expression_attribute_names=attribute_names
+    )
     if ddb_item:
-        return JobPosting.from_dynamo_object(ddb_item)
+        return JobPosting.from_dynamo_object(ddb_item, fields)
     else:
         return None
 
-def get_job_posting_by_external_id(external_id: str) -> JobPosting:
-    serializer = TypeSerializer()
+def list_job_postings(job_posting_ids: list[str], fields: list[str] = None) -> list[JobPosting]:
+    """
+    Get the JobPosting records in bulk, ids without a record are left out.
+    With fields, only those fields are read, the others are fetched on first access
+    """
+    fields = _normalize_fields(fields)
+    projection_expression, attribute_names = _build_projection(fields)
 
-    ddb_items = DynamoDB.query(
+    ddb_items = DynamoDB.batch_get_item(
         table_name=_JOB_POSTING_TABLE_NAME,
-        index_name='Index_ExternalId',   
+        keys=[{'Id': _SERIALIZER.serialize(x)} for x in dict.fromkeys(job_posting_ids)],
+        projection_expression=projection_expression,
+        expression_attribute_names=attribute_names
+    )
+
+    return [JobPosting.from_dynamo_object(ddb_item, fields) for ddb_item in ddb_items]
+
+def get_job_posting_by_external_id(external_id: str, fields: list[str] = None) -> JobPosting:
+    """
+    By default, the fields projected in Index_ExternalId are read, the others are fetched on first access
+    """
+    return _get_job_posting_by_index(
+        index_name='Index_ExternalId',
         key_condition_expression='ExternalId = :externalId',
-        expression_attribute_values={':externalId': serializer.serialize(external_id)}
+        expression_attribute_values={':externalId': _SERIALIZER.serialize(external_id)},
+        fields=fields
+    )
+
+def get_job_posting_by_origin_url(origin_url: str, fields: list[str] = None) -> JobPosting:
+    """
+    By default, the fields projected in Index_OriginUrlDownloadState are read, the others are fetched on first access
+    """
+    global _origin_url_index_unavailable_until
+
+    key_condition_expression = 'OriginUrl = :originUrl'
+    expression_attribute_values = {':originUrl': _SERIALIZER.serialize(origin_url)}
+
+    if datetime.now() >= _origin_url_index_unavailable_until:
+        try:
+            return _get_job_posting_by_index(
+                index_name='Index_OriginUrlDownloadState',
+                key_condition_expression=key_condition_expression,
+                expression_attribute_values=expression_attribute_values,
+                fields=fields
+            )
+        except ClientError as e:
+            # Raised when the index does not exist yet, or is still backfilling
+            if e.response['Error']['Code'] not in ('ValidationException', 'ResourceNotFoundException'):
+                raise e
+            logging.warning('Index_OriginUrlDownloadState is not available, falling back to Index_OriginUrl')
+            _origin_url_index_unavailable_until = datetime.now() + _ORIGIN_URL_INDEX_RETRY_INTERVAL
+
+    # Keys only, the fields outside the projection are fetched from the table
+    return _get_job_posting_by_index(
+        index_name='Index_OriginUrl',
+        key_condition_expression=key_condition_expression,
+        expression_attribute_values=expression_attribute_values,
+        fields=fields or _INDEX_FIELDS['Index_OriginUrlDownloadState']
     )
-    if ddb_items:
-        return JobPosting.from_dynamo_object(ddb_items[0])
-    else:
-        return None
 
-def get_job_posting_by_origin_url(origin_url: str) -> JobPosting:
-    serializer = TypeSerializer()
+def _get_job_posting_by_index(index_name: str, key_condition_expression: str, expression_attribute_values: dict, fields: list[str] = None) -> JobPosting:
+    index_fields = _INDEX_FIELDS[index_name]
+    fields = _normalize_fields(fields) or index_fields
+
+    # The index cannot return the attributes outside its projection
+    projection_expression, attribute_names = _build_projection(fields & index_fields)
 
     ddb_items = DynamoDB.query(
         table_name=_JOB_POSTING_TABLE_NAME,
-        index_name='Index_OriginUrl',
-        key_condition_expression='OriginUrl = :originUrl',
-        expression_attribute_values={':originUrl': serializer.serialize(origin_url)}
+        index_name=index_name,
+        key_condition_expression=key_condition_expression,
+        projection_expression=projection_expression,
+        expression_attribute_values=expression_attribute_values,
+        expression_attribute_names=attribute_names
     )
-    if ddb_items:
-        return JobPosting.from_dynamo_object(ddb_items[0])
-    else:
+    if not ddb_items:
         return None
 
+    job_posting = JobPosting.from_dynamo_object(ddb_items[0], fields & index_fields)
+    if not fields <= index_fields:
+        job_posting._load_fields(fields - index_fields)
+    return job_posting
+
+def _normalize_fields(fields: list[str] = None) -> frozenset[str]:
+    if fields is None:
+        return None
+
+    unknown_fields = set(fields) - _FIELD_NAMES
+    if unknown_fields:
+        raise ValueError(f'Unknown JobPosting fields {sorted(unknown_fields)}')
+
+    # The id is needed to fetch the other fields
+    return frozenset(fields) | {'id'}
+
+def _build_projection(fields: frozenset[str] = None) -> tuple[str, dict]:
+    """
+    Returns the ProjectionExpression and its ExpressionAttributeNames, attribute names such as Source are reserved words
+    """
+    if fields is None:
+        return None, None
+
+    attribute_names = {f'#{attribute}': attribute for x in sorted(fields) for attribute in _FIELD_ATTRIBUTES[x]}
+    return ', '.join(attribute_names), attribute_names
+
+def _serialize_large_string(job_posting_id: str, attribute: str, value: str, offloads: list[tuple[str, bytes]] = None) -> dict:
+    """
+    Returns the attribute storing the value, offloaded when it is larger than _OFFLOAD_THRESHOLD_BYTES.
+    The S3 object of the 's3' offload is not uploaded here, its key and body are added to offloads
+    """
+    byte_value = value.encode('utf-8')
+    if _OFFLOAD == _OFFLOAD_NONE or len(byte_value) <= _OFFLOAD_THRESHOLD_BYTES:
+        return {attribute: {'S': value}}
+
+    if _OFFLOAD == _OFFLOAD_S3:
+        if offloads is None:
+            raise ValueError(u'offloads is required by the s3 offload')
+
+        key = f'{job_posting_id}/{attribute}'
+        offloads.append((key, gzip.compress(byte_value, compresslevel=GZIP_COMPRESS_LEVEL)))
+        return {f'{attribute}S3Key': {'S': key}}
+
+    return {f'{attribute}Compressed': {'B': gzip.compress(byte_value, compresslevel=GZIP_COMPRESS_LEVEL)}}
+
+def _upload_offloads(offloads: list[tuple[str, bytes]]) -> None:
+    """
+    Uploaded after the write of the item, so that a skipped or failed write does not upload anything
+    """
+    for key, body in offloads:
+        S3.upload_gzip_bytes(body, _OFFLOAD_BUCKET, key, content_type='text/plain; charset=utf-8')
+
+def _deserialize_offloaded_string(dynamo_object: dict, attribute: str) -> str:
+    if f'{attribute}Compressed' in dynamo_object:
+        return gzip.decompress(dynamo_object[f'{attribute}Compressed']['B']).decode('utf-8')
+
+    if f'{attribute}S3Key' in dynamo_object:
+        # Read with the bucket of the offload, the key does not carry it
+        return S3.download_file_str(_OFFLOAD_BUCKET, dynamo_object[f'{attribute}S3Key']['S'])
+
+    return None
+
 def create_job_posting(**kwargs) -> JobPosting:
     if 'id' not in kwargs:
         kwargs['id'] = str(uuid.uuid4())
 
     job_posting = JobPosting(**kwargs)
     job_posting.created_datetime = datetime.now()
+    if job_posting.job_description:
+        job_posting.job_description = _cleansing_string(job_posting.job_description)
 
     logging.info(f"Creating JobPosting {job_posting}")
 
+    offloads = []
     DynamoDB.put_item(
         table_name=_JOB_POSTING_TABLE_NAME,
-        item=job_posting.to_dynamo_object()
+        item=job_posting.to_dynamo_object(offloads)
     )
+    _upload_offloads(offloads)
 
     return job_posting
 
-def update_job_posting_origin_url(job_posting_id: str, origin_url: str) -> None:
-    serializer = TypeSerializer()
-
-    expression = (
-        'SET '
-        'OriginUrl = :originUrl,'
-        'UpdatedDatetime = :now'
-    )
+def update_job_posting_download_state(job_posting_id: str, origin_url: str = None, uploaded_datetime: datetime = None, content_hash: str = None) -> None:
+    expression = 'SET '
 
     attribute_values = {
-        ':job_posting_id': serializer.serialize(job_posting_id),
-        ':originUrl': serializer.serialize(origin_url),
-        ':now': serializer.serialize(datetime.now().isoformat())
+        ':job_posting_id': _SERIALIZER.serialize(job_posting_id),
+        ':now': _SERIALIZER.serialize(datetime.now().isoformat())
     }
 
+    if origin_url:
+        expression += 'OriginUrl = :originUrl, '
+        attribute_values[':originUrl'] = _SERIALIZER.serialize(origin_url)
+
+    if uploaded_datetime:
+        expression += 'UploadedDatetime = :uploadedDatetime, '
+        attribute_values[':uploadedDatetime'] = _SERIALIZER.serialize(uploaded_datetime.isoformat())
+
+    if content_hash:
+        expression += 'ContentHash = :contentHash, '
+        attribute_values[':contentHash'] = _SERIALIZER.serialize(content_hash)
+
+    expression += 'UpdatedDatetime = :now'
+
     DynamoDB.update_item(
         table_name=_JOB_POSTING_TABLE_NAME,
-        key={'Id': serializer.serialize(job_posting_id)},
+        key={'Id': _SERIALIZER.serialize(job_posting_id)},
         update_expression=expression,
         expression_attribute_values=attribute_values,
         condition_expression='Id = :job_posting_id' # Only update when the Id exists
     )
 
 
-def update_job_posting_from_parsed_info(job_posting_id: str, **kwargs) -> None:
-    serializer = TypeSerializer()
+def update_job_posting_from_parsed_info(job_posting_id: str, skip_unchanged: bool = False, **kwargs) -> bool:
+    """
+    Returns whether the record has been updated. With skip_unchanged, a record whose ParsedHash is the given
+    parsed_hash is left as is, checked by the update itself rather than by reading the record first.
+    """
+    if skip_unchanged and 'parsed_hash' not in kwargs:
+        raise ValueError(u'parsed_hash is required to skip_unchanged')
 
     expression = 'SET '
 
     attribute_values = {
-        ':job_posting_id': serializer.serialize(job_posting_id),
-        ':now': serializer.serialize(datetime.now().isoformat())
+        ':job_posting_id': _SERIALIZER.serialize(job_posting_id),
+        ':now': _SERIALIZER.serialize(datetime.now().isoformat())
     }
 
     if 'title' in kwargs:
         expression += 'Title = :title, '
-        attribute_values[':title'] = serializer.serialize(kwargs['title'])
+        attribute_values[':title'] = _SERIALIZER.serialize(kwargs['title'])
 
     if 'company_name' in kwargs:
         expression += 'CompanyName = :companyName, '
-        attribute_values[':companyName'] = serializer.serialize(kwargs['company_name'])
+        attribute_values[':companyName'] = _SERIALIZER.serialize(kwargs['company_name'])
 
     if 'location' in kwargs:
         expression += 'LocationString = :location, '
-        attribute_values[':location'] = serializer.serialize(kwargs['location'])
+        attribute_values[':location'] = _SERIALIZER.serialize(kwargs['location'])
 
+    remove_attributes = []
+    offloads = []
     if 'job_description' in kwargs:
-        expression += 'JobDescription = :jobDescription, '
-        attribute_values[':jobDescription'] = serializer.serialize(_cleansing_string(kwargs['job_description']))
+        # Stored in one of the attributes of the field, the others are removed
+        (attribute, ddb_value), = _serialize_large_string(job_posting_id, 'JobDescription', _cleansing_string(kwargs['job_description']), offloads).items()
+        expression += f'{attribute} = :jobDescription, '
+        attribute_values[':jobDescription'] = ddb_value
+        remove_attributes = [x for x in _FIELD_ATTRIBUTES['job_description'] if x != attribute]
 
     if 'posted_datetime' in kwargs:
         expression += 'PostedDatetime = :postedDatetime, '
-        attribute_values[':postedDatetime'] = serializer.serialize(kwargs['posted_datetime'].isoformat())
+        attribute_values[':postedDatetime'] = _SERIALIZER.serialize(kwargs['posted_datetime'].isoformat())
+
+    if 'parsed_hash' in kwargs:
+        expression += 'ParsedHash = :parsedHash, '
+        attribute_values[':parsedHash'] = _SERIALIZER.serialize(kwargs['parsed_hash'])
 
     expression += 'UpdatedDatetime = :now'
 
-    DynamoDB.update_item(
+    if remove_attributes:
+        expression += ' REMOVE ' + ', '.join(remove_attributes)
+
+    condition_expression = 'Id = :job_posting_id' # Only update when the Id exists
+    if skip_unchanged:
+        condition_expression += ' AND (attribute_not_exists(ParsedHash) OR ParsedHash <> :parsedHash)'
+
+    try:
+        DynamoDB.update_item(
+            table_name=_JOB_POSTING_TABLE_NAME,
+            key={'Id': _SERIALIZER.serialize(job_posting_id)},
+            update_expression=expression,
+            expression_attribute_values=attribute_values,
+            condition_expression=condition_expression
+        )
+    except ClientError as e:
+        if skip_unchanged and e.response['Error']['Code'] == 'ConditionalCheckFailedException' and _has_parsed_hash(job_posting_id, kwargs['parsed_hash']):
+            logging.info(f'JobPosting [{job_posting_id}] is unchanged, skipping the update')
+            return False
+        raise e
+
+    try:
+        _upload_offloads(offloads)
+    except Exception:
+        if 'parsed_hash' in kwargs:
+            # Otherwise the retry would be skipped as unchanged, and the offloaded object never uploaded
+            DynamoDB.update_item(
+                table_name=_JOB_POSTING_TABLE_NAME,
+                key={'Id': _SERIALIZER.serialize(job_posting_id)},
+                update_expression='REMOVE ParsedHash'
+            )
+        raise
+
+    return True
+
+def _has_parsed_hash(job_posting_id: str, parsed_hash: str) -> bool:
+    """
+    Tells an unchanged record from a missing one after the condition of an update failed.
+    Only ParsedHash is read, the failed update does not return the item with the deployed botocore.
+    """
+    ddb_item = DynamoDB.get_item(
         table_name=_JOB_POSTING_TABLE_NAME,
-        key={'Id': serializer.serialize(job_posting_id)},
-        update_expression=expression,
-        expression_attribute_values=attribute_values,
-        condition_expression='Id = :job_posting_id' # Only update when the Id exists
+        key_attr={'Id': _SERIALIZER.serialize(job_posting_id)},
+        projection_expression='ParsedHash'
     )
+    return bool(ddb_item) and ddb_item.get('ParsedHash') == _SERIALIZER.serialize(parsed_hash)
+
+class JobPostingWriter():
+    """
+    Buffers JobPosting records and writes them with BatchWriteItem, 25 items per call.
+    A put replaces the whole item, so the JobPosting should carry all of its attributes, and no other
+    writer should be updating the record meanwhile. Meant for bulk loads of new records, e.g. an import;
+    the functions update existing records field by field instead.
+
+        with JobPostingWriter() as writer:
+            for job_posting in job_postings:
+                writer.put(job_posting)
+    """
+
+    def __init__(self, batch_size: int = 25):
+        if batch_size < 1:
+            raise ValueError(u'batch_size must be a positive number')
+
+        self._batch_size = batch_size
+        # Keyed by Id, BatchWriteItem rejects a request with the same key twice
+        self._buffer: dict[str, JobPosting] = {}
+
+    def __enter__(self) -> JobPostingWriter:
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if exc_type is None:
+            self.flush()
+        elif self._buffer:
+            logging.warning(f'Discarding {len(self._buffer)} buffered JobPosting records because of {exc_type.__name__}')
+            self._buffer.clear()
+
+    def create(self, **kwargs) -> JobPosting:
+        if 'id' not in kwargs:
+            kwargs['id'] = str(uuid.uuid4())
+
+        job_posting = JobPosting(**kwargs)
+        job_posting.created_datetime = datetime.now()
+        self.put(job_posting)
+        return job_posting
+
+    def put(self, job_posting: JobPosting) -> None:
+        job_posting.updated_datetime = datetime.now()
+        if getattr(job_posting, 'job_description', None):
+            job_posting.job_description = _cleansing_string(job_posting.job_description)
+
+        self._buffer[job_posting.id] = job_posting
+        if len(self._buffer) >= self._batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self._buffer:
+            return
+
+        logging.info(f'Writing {len(self._buffer)} JobPosting records')
+
+        offloads = []
+        DynamoDB.batch_write_item(
+            table_name=_JOB_POSTING_TABLE_NAME,
+            put_items=[x.to_dynamo_object(offloads) for x in self._buffer.values()]
+        )
+        _upload_offloads(offloads)
+        self._buffer.clear()
+
+
+# Parts of a page which change on every request, e.g. nonces, tracking IDs and inline scripts
+_VOLATILE_PAGE_PARTS = re.compile(r'<script\b.*?</script>|<style\b.*?</style>|<!--.*?-->', flags=re.DOTALL | re.IGNORECASE)
+_TAG_ATTRIBUTES = re.compile(r'<([a-zA-Z][a-zA-Z0-9]*)\b[^>]*>')
+_WHITESPACES = re.compile(r'\s+')
+_WHITESPACES_AROUND_TAGS = re.compile(r'\s*(<[^>]*>)\s*')
+
+# posted_datetime is left out, it is parsed from a relative "Posted 3 days ago"
+_PARSED_HASH_FIELDS = ('title', 'company_name', 'location', 'job_description')
+
+
+def compute_content_hash(content: str) -> str:
+    """
+    Hash of the page, normalized to its tags and text, so that re-crawling an unchanged page gives the same hash
+    """
+    normalized = _VOLATILE_PAGE_PARTS.sub('', content)
+    normalized = _TAG_ATTRIBUTES.sub(r'<\1>', normalized)
+    normalized = _WHITESPACES_AROUND_TAGS.sub(r'\1', normalized)
+    normalized = _WHITESPACES.sub(' ', normalized).strip()
+    return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
+def compute_parsed_hash(parsed: dict) -> str:
+    """
+    Hash of the parsed fields, as written by update_job_posting_from_parsed_info()
+    """
+    digest = hashlib.sha256()
+    for field in _PARSED_HASH_FIELDS:
+        value = parsed.get(field) or ''
+        if field == 'job_description':
+            value = _cleansing_string(value)
+        digest.update(value.encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
 
 def _cleansing_string(content: str) -> str:
     return content.replace(u'\ufeff', '')
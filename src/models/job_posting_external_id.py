@@ -0,0 +1,37 @@
+""" Lookup from the external ID of a job posting to the JobPosting record """
+import os
+
+from aws.dynamo_db import DynamoDB
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+from config import DYNAMODB_TABLE_JOB_POSTING_EXTERNAL_ID_ENV_KEY
+
+_JOB_POSTING_EXTERNAL_ID_TABLE_NAME = os.environ[DYNAMODB_TABLE_JOB_POSTING_EXTERNAL_ID_ENV_KEY]
+
+
+def put_job_posting_external_id(external_id: str, job_posting_id: str) -> None:
+    serializer = TypeSerializer()
+
+    DynamoDB.put_item(
+        table_name=_JOB_POSTING_EXTERNAL_ID_TABLE_NAME,
+        item={
+            'ExternalId': serializer.serialize(external_id),
+            'JobPostingId': serializer.serialize(job_posting_id),
+        }
+    )
+
+def list_existing_external_ids(external_ids: list[str]) -> set[str]:
+    """
+    Returns the subset of external_ids which already have a JobPosting record
+    """
+    serializer = TypeSerializer()
+    deserializer = TypeDeserializer()
+
+    unique_external_ids = list(dict.fromkeys(x for x in external_ids if x))
+
+    ddb_items = DynamoDB.batch_get_item(
+        table_name=_JOB_POSTING_EXTERNAL_ID_TABLE_NAME,
+        keys=[{'ExternalId': serializer.serialize(x)} for x in unique_external_ids],
+        projection_expression='ExternalId'
+    )
+
+    return {deserializer.deserialize(ddb_item['ExternalId']) for ddb_item in ddb_items}
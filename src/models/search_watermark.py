@@ -0,0 +1,41 @@
+""" The most recent job postings seen by each search, where the next run of the search can stop """
+import os
+from datetime import datetime
+
+from aws.dynamo_db import DynamoDB
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+from config import DYNAMODB_TABLE_SEARCH_WATERMARK_ENV_KEY
+
+_SEARCH_WATERMARK_TABLE_NAME = os.environ[DYNAMODB_TABLE_SEARCH_WATERMARK_ENV_KEY]
+
+# Several IDs rather than the latest one, re-posted job postings are not in date order
+MAX_WATERMARK_EXTERNAL_IDS = 100
+
+
+def get_search_watermark(search_key: str) -> list[str]:
+    """
+    Returns the external IDs of the most recent job postings seen by the search, most recent first
+    """
+    serializer = TypeSerializer()
+    deserializer = TypeDeserializer()
+
+    ddb_item = DynamoDB.get_item(
+        table_name=_SEARCH_WATERMARK_TABLE_NAME,
+        key_attr={'SearchKey': serializer.serialize(search_key)}
+    )
+    if not ddb_item or 'RecentExternalIds' not in ddb_item:
+        return []
+
+    return deserializer.deserialize(ddb_item['RecentExternalIds'])
+
+def put_search_watermark(search_key: str, recent_external_ids: list[str]) -> None:
+    serializer = TypeSerializer()
+
+    DynamoDB.put_item(
+        table_name=_SEARCH_WATERMARK_TABLE_NAME,
+        item={
+            'SearchKey': serializer.serialize(search_key),
+            'RecentExternalIds': serializer.serialize(recent_external_ids[:MAX_WATERMARK_EXTERNAL_IDS]),
+            'UpdatedDatetime': serializer.serialize(datetime.now().isoformat())
+        }
+    )
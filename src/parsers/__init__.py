@@ -0,0 +1 @@
+""" Parsers of the crawled pages """
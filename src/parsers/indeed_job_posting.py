@@ -0,0 +1,146 @@
+""" Parser of the job posting pages of Indeed """
+
+import logging
+import os
+from datetime import datetime, timedelta
+
+from bs4 import BeautifulSoup, FeatureNotFound, SoupStrainer
+from config import INDEED_JOB_PARSER_BACKEND_ENV_KEY
+from exceptions.exceptions import JobPostingParseError
+
+_BACKEND_FULL = 'full'  # html.parser over the whole document
+_BACKEND_STRAINED = 'strained'  # html.parser, keeping only the elements read below
+_BACKEND_LXML = 'lxml'  # lxml, keeping only the elements read below
+
+_PARSER_BACKEND = os.environ.get(INDEED_JOB_PARSER_BACKEND_ENV_KEY, _BACKEND_STRAINED)
+
+_TITLE_CLASS = 'jobsearch-JobInfoHeader-title'
+_JOB_DESCRIPTION_CLASS = 'jobsearch-jobDescriptionText'
+_COMPANY_CLASS = 'jobsearch-InlineCompanyRating'
+_SUBTITLE_CLASS = 'jobsearch-JobInfoHeader-subtitle'
+_FOOTER_CLASS = 'jobsearch-JobMetadataFooter'
+
+_PARSED_CLASSES = frozenset([_TITLE_CLASS, _JOB_DESCRIPTION_CLASS, _COMPANY_CLASS, _SUBTITLE_CLASS, _FOOTER_CLASS])
+
+
+def _has_parsed_class(class_attr) -> bool:
+    # The strainer sees the raw attribute, e.g. "jobsearch-JobInfoHeader-title icl-u-xs-mb--xs"
+    if not class_attr:
+        return False
+    classes = class_attr.split() if isinstance(class_attr, str) else class_attr
+    return not _PARSED_CLASSES.isdisjoint(classes)
+
+
+_STRAINER = SoupStrainer(['h1', 'div'], class_=_has_parsed_class)
+
+
+def parse_job_posting(file: str, file_name: str) -> dict:
+    """
+    Returns the fields parsed from the page, as taken by update_job_posting_from_parsed_info(),
+    None for an empty page. Raises JobPostingParseError when a field cannot be found
+    """
+    if not file:
+        logging.error(f'Received an empty file [{file_name}]')
+        return
+
+    soup = _build_soup(file, _PARSER_BACKEND)
+    try:
+        return _extract_job_posting(soup)
+    except JobPostingParseError as ex:
+        if _PARSER_BACKEND == _BACKEND_FULL:
+            raise ex
+
+        # The strained tree only has the elements we know about, try again with the whole document
+        logging.warning(f'Parsing [{file_name}] with backend [{_PARSER_BACKEND}] failed with [{ex}], falling back to [{_BACKEND_FULL}]')
+        return _extract_job_posting(_build_soup(file, _BACKEND_FULL))
+
+def _build_soup(file: str, backend: str) -> BeautifulSoup:
+    if backend == _BACKEND_LXML:
+        try:
+            return BeautifulSoup(file, 'lxml', parse_only=_STRAINER)
+        except FeatureNotFound:
+            logging.warning(f'lxml is not installed, using backend [{_BACKEND_STRAINED}]')
+            backend = _BACKEND_STRAINED
+
+    if backend == _BACKEND_STRAINED:
+        return BeautifulSoup(file, 'html.parser', parse_only=_STRAINER)
+
+    return BeautifulSoup(file, 'html.parser')
+
+def _extract_job_posting(soup: BeautifulSoup) -> dict:
+    title_h1 = soup.find("h1", class_=_TITLE_CLASS)
+    if title_h1:
+        job_title = title_h1.string
+    else:
+        job_title = ''
+
+    jd_div = soup.find("div", class_=_JOB_DESCRIPTION_CLASS)
+    if jd_div:
+        job_description = '\n'.join([x for x in jd_div.strings])
+    else:
+        job_description = ''
+
+    company_div = soup.find("div", class_=_COMPANY_CLASS)
+    if company_div and company_div.contents:
+        company_name = next(x.string for x in company_div.contents if x.string)
+    else:
+        company_name = ''
+
+    subtitle_div = soup.find("div", class_=_SUBTITLE_CLASS)
+    if subtitle_div and subtitle_div.contents:
+        location_contents = [subtitle_div.contents[-2].string]
+        if subtitle_div.contents[-1].string:
+            location_contents.append(subtitle_div.contents[-1].string)
+        location = '/'.join(location_contents)
+    else:
+        location = ''
+
+    posted_datetime = _parse_posted_datetime(soup)
+
+    logging.info(f'Parsed data: {job_title}, {company_name}, {location}')
+
+    if not job_title:
+        raise JobPostingParseError('Cannot parse JobTitle')
+    
+    if not company_name:
+        raise JobPostingParseError('Cannot parse CompanyName')
+
+    if not location:
+        raise JobPostingParseError('Cannot parse Location')
+
+    if not job_description:
+        raise JobPostingParseError('Cannot parse JobDescription')
+
+    if not posted_datetime:
+        raise JobPostingParseError('Cannot parse PostedDateTime')
+
+    return {
+        'title': job_title, 
+        'company_name': company_name,
+        'location': location,
+        'job_description': job_description,
+        'posted_datetime': posted_datetime
+    }
+
+def _parse_posted_datetime(soup: BeautifulSoup) -> datetime:
+    footer_div = soup.find("div", class_=_FOOTER_CLASS)
+    if not footer_div:
+        return datetime.now()
+
+    footers = footer_div.stripped_strings
+    for s in footers:
+        if s.endswith(" days ago"):
+            if s.replace(" days ago", "") == "30+":
+                n = 30
+            else:
+                n = int(s.replace(" days ago", ""))
+            dt = datetime.now() - timedelta(days=n)
+            return dt.replace(hour=0, minute=0, second=0, microsecond=0)
+        if s == "1 day ago":
+            dt = datetime.now() - timedelta(days=1)
+            return dt.replace(hour=0, minute=0, second=0, microsecond=0)
+        if s == "Today":
+            dt = datetime.now()
+            return dt.replace(hour=0, minute=0, second=0, microsecond=0)
+
+    return datetime.now()
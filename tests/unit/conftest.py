@@ -0,0 +1,83 @@
+import os
+import sys
+
+import pytest
+
+# The Lambda functions import their modules from src/, the CodeUri of every function
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'src'))
+
+# Read by the models at import time
+for key, value in {
+    'AWS_ACCESS_KEY_ID': 'testing',
+    'AWS_SECRET_ACCESS_KEY': 'testing',
+    'AWS_DEFAULT_REGION': 'us-west-2',
+    'INDEED_JOB_POSTING_S3_BUCKET': 'test-indeed-job-posting',
+    'CRAWLER_PROXY_TABLE': 'CrawlerProxyTable',
+    'CRAWL_RATE_LIMIT_TABLE': 'CrawlRateLimitTable',
+    'JOB_POSTING_TABLE': 'JobPostingTable',
+    'JOB_POSTING_EXTERNAL_ID_TABLE': 'JobPostingExternalIdTable',
+    'SEARCH_WATERMARK_TABLE': 'SearchWatermarkTable',
+    'STATE_MACHINE_EXECUTION_NOTIFICATION_TOPIC': 'placeholder',
+}.items():
+    os.environ.setdefault(key, value)
+
+
+@pytest.fixture
+def aws():
+    """ Mocked AWS services, the shared clients are created again inside the mock """
+    from moto import mock_aws
+
+    from aws import client_factory
+
+    with mock_aws():
+        client_factory._clients.clear()
+        yield
+        client_factory._clients.clear()
+
+
+def _create_table(name: str, key: str, indexes: list[tuple[str, str, dict]] = ()) -> None:
+    from aws.client_factory import get_client
+
+    attributes = {key} | {index_key for _, index_key, _ in indexes}
+    kwargs = {
+        'TableName': name,
+        'AttributeDefinitions': [{'AttributeName': x, 'AttributeType': 'S'} for x in sorted(attributes)],
+        'KeySchema': [{'AttributeName': key, 'KeyType': 'HASH'}],
+        'BillingMode': 'PAY_PER_REQUEST',
+    }
+    if indexes:
+        kwargs['GlobalSecondaryIndexes'] = [
+            {'IndexName': index_name, 'KeySchema': [{'AttributeName': index_key, 'KeyType': 'HASH'}], 'Projection': projection}
+            for index_name, index_key, projection in indexes
+        ]
+    get_client('dynamodb').create_table(**kwargs)
+
+
+@pytest.fixture
+def job_posting_table(aws):
+    # As in template.yaml
+    _create_table(os.environ['JOB_POSTING_TABLE'], 'Id', [
+        ('Index_ExternalId', 'ExternalId', {'ProjectionType': 'INCLUDE', 'NonKeyAttributes': ['OriginUrl']}),
+        ('Index_OriginUrl', 'OriginUrl', {'ProjectionType': 'KEYS_ONLY'}),
+        ('Index_OriginUrlDownloadState', 'OriginUrl', {'ProjectionType': 'INCLUDE', 'NonKeyAttributes': ['ExternalId', 'UploadedDatetime']}),
+    ])
+
+
+@pytest.fixture
+def crawl_rate_limit_table(aws):
+    _create_table(os.environ['CRAWL_RATE_LIMIT_TABLE'], 'Id')
+
+
+@pytest.fixture
+def search_watermark_table(aws):
+    _create_table(os.environ['SEARCH_WATERMARK_TABLE'], 'SearchKey')
+
+
+@pytest.fixture
+def job_posting_external_id_table(aws):
+    _create_table(os.environ['JOB_POSTING_EXTERNAL_ID_TABLE'], 'ExternalId')
+
+
+@pytest.fixture
+def crawler_proxy_table(aws):
+    _create_table(os.environ['CRAWLER_PROXY_TABLE'], 'Id')
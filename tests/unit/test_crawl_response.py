@@ -0,0 +1,53 @@
+import base64
+import gzip
+from unittest import mock
+
+import pytest
+
+from crawler import crawl_response
+from crawler.crawl_response import CrawlResponse
+
+_PAGE = '<html><body><h1>Data Analyst</h1><p>Café, 5 days ago</p></body></html>'
+
+
+def test_content_is_compressed_on_demand():
+    response = CrawlResponse(url='https://ca.indeed.com/viewjob?jk=1', content=_PAGE)
+
+    assert gzip.decompress(response.compressed_content).decode('utf-8') == _PAGE
+
+
+def test_compressed_content_is_decompressed_on_demand():
+    response = CrawlResponse(url='https://ca.indeed.com/viewjob?jk=1', compressed_content=gzip.compress(_PAGE.encode('utf-8')))
+
+    assert response.contains('Café')
+    assert not response.contains('www.hcaptcha.com')
+    assert response.content == _PAGE
+
+
+@mock.patch.object(crawl_response, '_SEARCH_CHUNK_BYTES', 7)
+def test_contains_finds_the_text_across_chunks():
+    response = CrawlResponse(url='https://ca.indeed.com/viewjob?jk=1', compressed_content=gzip.compress(_PAGE.encode('utf-8')))
+
+    # Every substring of the page, whichever chunks it falls in
+    assert all(response.contains(_PAGE[i:i + 12]) for i in range(len(_PAGE) - 11))
+    assert not response.contains('Data Scientist')
+    # Searched without decoding the page
+    assert response._content is None
+
+
+def test_from_proxy_response():
+    plain = CrawlResponse.from_proxy_response({'url': 'u', 'statusCode': 200, 'content': _PAGE})
+    compressed = CrawlResponse.from_proxy_response({
+        'url': 'u',
+        'statusCode': 200,
+        'contentEncoding': 'gzip',
+        'content': base64.b64encode(gzip.compress(_PAGE.encode('utf-8'))).decode('ascii')
+    })
+
+    assert plain.content == _PAGE
+    assert compressed.content == _PAGE
+
+
+def test_content_is_required():
+    with pytest.raises(ValueError):
+        CrawlResponse(url='u')
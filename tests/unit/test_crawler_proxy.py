@@ -0,0 +1,73 @@
+import os
+from datetime import datetime
+from unittest import mock
+
+import pytest
+
+from aws.client_factory import get_client
+from botocore.exceptions import ClientError
+from models import crawler_proxy
+from models.crawler_proxy import (CrawlerProxy, list_active_crawler_proxy,
+                                  record_crawler_proxy_stats)
+
+_LEGACY_ITEM = {
+    'Id': {'S': 'proxy-west'},
+    'Region': {'S': 'us-west-2'},
+    'Arn': {'S': 'arn:aws:lambda:us-west-2:000000000000:function:proxy-west'},
+    'DeactivatedEpochSecond': {'N': '0'},
+    'DeactivatedCount': {'N': '0'},
+}
+
+
+@pytest.fixture
+def dynamo_db():
+    with mock.patch.object(crawler_proxy, '_legacy_crawler_proxies_migrated', False), \
+            mock.patch.object(crawler_proxy, 'DynamoDB') as dynamo_db_mock:
+        yield dynamo_db_mock
+
+
+def test_legacy_proxies_are_migrated_once(dynamo_db):
+    dynamo_db.query.return_value = []
+    dynamo_db.scan.return_value = [_LEGACY_ITEM]
+
+    assert [x.id for x in list_active_crawler_proxy(datetime.now())] == ['proxy-west']
+    assert dynamo_db.update_item.call_count == 1
+
+    # Every proxy is cooling down, no scan this time
+    assert list_active_crawler_proxy(datetime.now()) == []
+    assert dynamo_db.scan.call_count == 1
+
+
+def test_no_scan_when_the_index_has_active_proxies(dynamo_db):
+    dynamo_db.query.return_value = [{**_LEGACY_ITEM, 'AvailabilityPartition': {'S': 'ALL'}, 'ReactivateEpochSecond': {'N': '0'}}]
+
+    assert [x.id for x in list_active_crawler_proxy(datetime.now())] == ['proxy-west']
+    dynamo_db.scan.assert_not_called()
+
+
+def _get_item(proxy_id: str) -> dict:
+    return get_client('dynamodb').get_item(TableName=os.environ['CRAWLER_PROXY_TABLE'], Key={'Id': {'S': proxy_id}}).get('Item')
+
+
+def test_stats_are_added_to_the_counters(crawler_proxy_table):
+    get_client('dynamodb').put_item(TableName=os.environ['CRAWLER_PROXY_TABLE'], Item={**_LEGACY_ITEM, 'FailureStreak': {'N': '3'}})
+
+    record_crawler_proxy_stats('proxy-west', {'Success': 2, 'Captcha': 1}, 1500)
+    record_crawler_proxy_stats('proxy-west', {'Success': 1}, 500, reset_failure_streak=True)
+
+    proxy = CrawlerProxy(_get_item('proxy-west'))
+    assert proxy.outcome_counts == {**{x: 0 for x in crawler_proxy.OUTCOMES}, 'Success': 3, 'Captcha': 1}
+    assert proxy.total_latency_millis == 2000
+    assert proxy.failure_streak == 0
+
+
+def test_stats_of_an_unknown_proxy_are_not_recorded(crawler_proxy_table):
+    with pytest.raises(ClientError):
+        record_crawler_proxy_stats('proxy-west', {'Success': 1}, 500)
+
+    assert _get_item('proxy-west') is None
+
+
+def test_unknown_outcome():
+    with pytest.raises(ValueError):
+        record_crawler_proxy_stats('proxy-west', {'Timeout': 1}, 500)
@@ -0,0 +1,102 @@
+import os
+from unittest import mock
+
+import pytest
+
+from aws import dynamo_db
+from aws.client_factory import get_client
+from aws.dynamo_db import DynamoDB
+from botocore.exceptions import ClientError
+
+_ITEM_COUNT = 25
+
+
+@pytest.fixture
+def items(job_posting_table):
+    """ Job postings 0 to 24, all with the same OriginUrl """
+    for i in range(_ITEM_COUNT):
+        get_client('dynamodb').put_item(TableName=os.environ['JOB_POSTING_TABLE'], Item={
+            'Id': {'S': str(i)},
+            'ExternalId': {'S': f'external-{i}'},
+            'OriginUrl': {'S': 'https://ca.indeed.com/rc/clk?jk=1'},
+        })
+
+
+@pytest.fixture
+def calls():
+    """ Counts the calls of the shared client, by operation """
+    client = get_client('dynamodb')
+    counts = {'query': 0, 'scan': 0}
+
+    def counting(method):
+        def call(**kwargs):
+            counts[method.__name__] += 1
+            return method(**kwargs)
+        return call
+
+    with mock.patch.object(client, 'query', counting(client.query)), \
+            mock.patch.object(client, 'scan', counting(client.scan)):
+        yield counts
+
+
+def test_iter_query_follows_the_pages(items, calls):
+    found = list(DynamoDB.iter_query(
+        table_name=os.environ['JOB_POSTING_TABLE'],
+        index_name='Index_OriginUrl',
+        key_condition_expression='OriginUrl = :origin_url',
+        expression_attribute_values={':origin_url': {'S': 'https://ca.indeed.com/rc/clk?jk=1'}},
+        page_size=10
+    ))
+
+    assert sorted(int(x['Id']['S']) for x in found) == list(range(_ITEM_COUNT))
+    # The last page is empty or short, no LastEvaluatedKey after it
+    assert calls['query'] in (3, 4)
+
+
+def test_iter_scan_follows_the_pages(items, calls):
+    found = list(DynamoDB.iter_scan(table_name=os.environ['JOB_POSTING_TABLE'], page_size=10))
+
+    assert sorted(int(x['Id']['S']) for x in found) == list(range(_ITEM_COUNT))
+    assert calls['scan'] in (3, 4)
+
+
+def test_iter_scan_stops_requesting_pages_with_the_consumer(items, calls):
+    scanned = DynamoDB.iter_scan(table_name=os.environ['JOB_POSTING_TABLE'], page_size=10)
+
+    assert len([x for _, x in zip(range(10), scanned)]) == 10
+    assert calls['scan'] == 1
+
+
+def test_iter_scan_requires_both_segment_arguments():
+    with pytest.raises(ValueError):
+        list(DynamoDB.iter_scan(table_name=os.environ['JOB_POSTING_TABLE'], segment=0))
+
+
+def test_parallel_scan_reads_every_segment(items, calls):
+    found = list(DynamoDB.parallel_scan(table_name=os.environ['JOB_POSTING_TABLE'], total_segments=3, page_size=4))
+
+    assert sorted(int(x['Id']['S']) for x in found) == list(range(_ITEM_COUNT))
+    assert calls['scan'] >= 3
+
+
+@mock.patch.object(dynamo_db, '_PARALLEL_SCAN_BUFFERED_PAGES', 1)
+def test_parallel_scan_stops_the_segments_with_the_consumer(items, calls):
+    scanned = DynamoDB.parallel_scan(table_name=os.environ['JOB_POSTING_TABLE'], total_segments=2, page_size=1)
+
+    assert next(scanned) is not None
+    # Returns once the segment threads are done, without reading the whole table
+    scanned.close()
+    assert calls['scan'] < _ITEM_COUNT
+
+
+def test_parallel_scan_raises_the_error_of_a_segment(items):
+    client = get_client('dynamodb')
+    scan = client.scan
+
+    def failing_scan(**kwargs):
+        if kwargs['Segment'] == 1:
+            raise ClientError({'Error': {'Code': 'ProvisionedThroughputExceededException', 'Message': 'Slow down'}}, 'Scan')
+        return scan(**kwargs)
+
+    with mock.patch.object(client, 'scan', failing_scan), pytest.raises(ClientError):
+        list(DynamoDB.parallel_scan(table_name=os.environ['JOB_POSTING_TABLE'], total_segments=2, page_size=4))
@@ -0,0 +1,44 @@
+import importlib.util
+import os
+
+import pytest
+
+_SCRIPT_PATH = os.path.join(os.path.dirname(__file__), '..', '..', 'scripts', 'profile_imports.py')
+
+
+def _load_profile_imports():
+    spec = importlib.util.spec_from_file_location('profile_imports', _SCRIPT_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+profile_imports = _load_profile_imports()
+
+# The import time itself depends on the machine, it is checked with `python scripts/profile_imports.py --budget-ms`.
+# Here, the modules which would slow down every cold start are checked instead.
+
+
+@pytest.mark.parametrize('module', profile_imports.list_handler_modules())
+def test_handler_does_not_import_the_mysql_client(module):
+    imported = {x['module'] for x in profile_imports.profile_import(module)}
+
+    assert 'sqlalchemy' not in imported
+    assert 'db_operator.mysql_client' not in imported
+
+
+def test_handler_does_not_import_unused_dependencies():
+    # With the environment of template.yaml, where the downloader parses the pages and imports bs4
+    imported = {x['module'] for x in profile_imports.profile_import('functions.indeed_downloader.indeed_downloader')}
+
+    assert 'aws.sns' not in imported
+    assert 'aws.secret_manager' not in imported
+    # The parser handler is not imported, only the shared parsing module
+    assert 'functions.indeed_job_parser.indeed_job_parser' not in imported
+    assert 'parsers.indeed_job_posting' in imported
+
+
+def test_notifier_does_not_import_the_parser():
+    imported = {x['module'] for x in profile_imports.profile_import('functions.state_machine_execution_notifier.state_machine_execution_notifier')}
+
+    assert 'bs4' not in imported
@@ -0,0 +1,124 @@
+import os
+from unittest import mock
+
+import pytest
+
+from aws.client_factory import get_client
+from crawler.crawl_response import CrawlResponse
+from exceptions.exceptions import MalFormedMessageException
+from functions.indeed_downloader import indeed_downloader
+from models.job_posting import get_job_posting
+from parsers.indeed_job_posting import parse_job_posting
+
+_ORIGIN_URL = 'https://ca.indeed.com/rc/clk?jk=1b9d06ebdd34033a'
+_FINAL_URL = 'https://ca.indeed.com/viewjob?jk=1b9d06ebdd34033a'
+_PAGE = (
+    '<html><body>'
+    '<h1 class="jobsearch-JobInfoHeader-title">Data Analyst</h1>'
+    '<div class="jobsearch-InlineCompanyRating"><div>Tofino</div></div>'
+    '<div class="jobsearch-JobInfoHeader-subtitle"><div>Tofino</div><div>Vancouver, BC</div></div>'
+    '<div class="jobsearch-jobDescriptionText"><p>Analyze the data.</p></div>'
+    '<div class="jobsearch-JobMetadataFooter"><div>3 days ago</div></div>'
+    '</body></html>'
+)
+
+
+@pytest.fixture
+def downloader(job_posting_table, job_posting_external_id_table):
+    """ Returns the mock of the crawl, the downloaded pages go to the mocked bucket """
+    get_client('s3').create_bucket(Bucket=os.environ['INDEED_JOB_POSTING_S3_BUCKET'], CreateBucketConfiguration={'LocationConstraint': 'us-west-2'})
+
+    with mock.patch.object(indeed_downloader.ProxiesManager, 'crawl') as crawl_mock:
+        yield crawl_mock
+
+
+@pytest.fixture
+def parse_in_place():
+    # As with INDEED_DOWNLOADER_PARSE=true, which is read at import time
+    with mock.patch.object(indeed_downloader, '_PARSE', True), \
+            mock.patch.object(indeed_downloader, 'parse_job_posting', parse_job_posting, create=True):
+        yield
+
+
+def test_new_page_is_parsed_in_place(downloader, parse_in_place):
+    downloader.return_value = CrawlResponse(url=_FINAL_URL, content=_PAGE)
+
+    response = indeed_downloader.lambda_handler({'url': _ORIGIN_URL}, None)
+
+    assert response['parsed']
+    job_posting = get_job_posting(response['s3_key'])
+    assert (job_posting.external_id, job_posting.title, job_posting.company_name) == ('1b9d06ebdd34033a', 'Data Analyst', 'Tofino')
+    assert job_posting.parsed_hash
+
+
+def test_page_is_left_to_the_parser_when_parsing_is_off(downloader):
+    downloader.return_value = CrawlResponse(url=_FINAL_URL, content=_PAGE)
+
+    response = indeed_downloader.lambda_handler({'url': _ORIGIN_URL}, None)
+
+    assert response['s3_key'] and not response['parsed']
+    assert get_job_posting(response['s3_key']).title is None
+
+
+def test_page_failing_to_parse_is_left_to_the_parser(downloader, parse_in_place):
+    downloader.return_value = CrawlResponse(url=_FINAL_URL, content='<html><body>Sign in</body></html>')
+
+    response = indeed_downloader.lambda_handler({'url': _ORIGIN_URL}, None)
+
+    assert response['s3_key'] and not response['parsed']
+    assert get_job_posting(response['s3_key']).parsed_hash is None
+
+
+def test_uploaded_page_is_not_downloaded_again(downloader, parse_in_place):
+    downloader.return_value = CrawlResponse(url=_FINAL_URL, content=_PAGE)
+    indeed_downloader.lambda_handler({'url': _ORIGIN_URL}, None)
+
+    assert indeed_downloader.lambda_handler({'url': _ORIGIN_URL}, None) == {'s3_key': '', 'parsed': False}
+    downloader.assert_called_once()
+
+
+def test_changed_page_of_an_existing_record_is_parsed_again(downloader, parse_in_place):
+    downloader.return_value = CrawlResponse(url=_FINAL_URL, content=_PAGE)
+    s3_key = indeed_downloader.lambda_handler({'url': _ORIGIN_URL}, None)['s3_key']
+
+    # The same job posting, found by its external ID from other search result URLs. The hash of the page is
+    # recorded by the first of them, new records are created without it
+    assert indeed_downloader.lambda_handler({'url': _ORIGIN_URL + '&vjs=3'}, None) == {'s3_key': '', 'parsed': False}
+    assert get_job_posting(s3_key).content_hash
+
+    downloader.return_value = CrawlResponse(url=_FINAL_URL, content=_PAGE.replace('Data Analyst', 'Senior Data Analyst'))
+    response = indeed_downloader.lambda_handler({'url': _ORIGIN_URL + '&fccid=3002307a9e5b4706'}, None)
+
+    assert response == {'s3_key': s3_key, 'parsed': True}
+    assert get_job_posting(s3_key).title == 'Senior Data Analyst'
+
+
+def test_batch_reports_a_status_per_url(downloader, parse_in_place):
+    failing_url = 'https://ca.indeed.com/rc/clk?jk=2'
+    unsupported_url = 'https://ca.indeed.com/rc/clk?jk=3'
+
+    def crawl(url, context=None):
+        if url == failing_url:
+            raise RuntimeError('No proxy answered')
+        if url == unsupported_url:
+            return CrawlResponse(url='https://example.com/careers', content=_PAGE)
+        return CrawlResponse(url=_FINAL_URL, content=_PAGE)
+
+    downloader.side_effect = crawl
+
+    response = indeed_downloader.batch_lambda_handler({'urls': [_ORIGIN_URL, failing_url, _ORIGIN_URL, unsupported_url]}, None)
+
+    results = {x['url']: x for x in response['job_postings']}
+    # Duplicated URLs are downloaded once
+    assert len(response['job_postings']) == 3
+    assert results[_ORIGIN_URL]['status'] == 'DOWNLOADED' and results[_ORIGIN_URL]['parsed']
+    assert get_job_posting(results[_ORIGIN_URL]['s3_key']).title == 'Data Analyst'
+    assert results[failing_url] == {'url': failing_url, 's3_key': '', 'status': 'FAILED', 'parsed': False}
+    assert results[unsupported_url] == {'url': unsupported_url, 's3_key': '', 'status': 'SKIPPED', 'parsed': False}
+
+
+def test_batch_rejects_a_malformed_event():
+    with pytest.raises(MalFormedMessageException):
+        indeed_downloader.batch_lambda_handler({'url': _ORIGIN_URL}, None)
+
+    assert indeed_downloader.batch_lambda_handler({'urls': []}, None) == {'job_postings': []}
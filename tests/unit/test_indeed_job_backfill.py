@@ -0,0 +1,95 @@
+import gzip
+import os
+from unittest import mock
+
+import pytest
+
+from aws.client_factory import get_client
+from aws.s3 import S3
+from functions.indeed_job_backfill import indeed_job_backfill
+from models.job_posting import create_job_posting, get_job_posting
+
+_BUCKET = os.environ['INDEED_JOB_POSTING_S3_BUCKET']
+_PAGE = (
+    '<html><body>'
+    '<h1 class="jobsearch-JobInfoHeader-title">{title}</h1>'
+    '<div class="jobsearch-InlineCompanyRating"><div>Tofino</div></div>'
+    '<div class="jobsearch-JobInfoHeader-subtitle"><div>Tofino</div><div>Vancouver, BC</div></div>'
+    '<div class="jobsearch-jobDescriptionText"><p>Analyze the data.</p></div>'
+    '<div class="jobsearch-JobMetadataFooter"><div>3 days ago</div></div>'
+    '</body></html>'
+)
+
+
+@pytest.fixture
+def bucket(job_posting_table):
+    """ Returns a function adding a page and its JobPosting record """
+    get_client('s3').create_bucket(Bucket=_BUCKET, CreateBucketConfiguration={'LocationConstraint': 'us-west-2'})
+
+    def add(key: str, title: str = 'Data Analyst'):
+        S3.upload_str(_PAGE.format(title=title), _BUCKET, key)
+        create_job_posting(id=key, external_id=f'external-{key}', title='Outdated title')
+
+    with mock.patch.object(indeed_job_backfill, '_CHUNK_SIZE', 2):
+        yield add
+
+
+def test_backfill_updates_the_records_and_checkpoints_each_chunk(bucket):
+    for key in 'abc':
+        bucket(key)
+    checkpoint = mock.Mock()
+
+    assert indeed_job_backfill.backfill(parse_workers=0, checkpoint=checkpoint) == ('c', True, [])
+
+    assert [get_job_posting(x).title for x in 'abc'] == ['Data Analyst'] * 3
+    assert checkpoint.call_args_list == [mock.call('b', []), mock.call('c', [])]
+
+
+def test_backfill_resumes_after_the_last_key(bucket):
+    for key in 'abc':
+        bucket(key)
+
+    # Stops before the second chunk
+    assert indeed_job_backfill.backfill(parse_workers=0, should_stop=mock.Mock(side_effect=[False, True])) == ('b', False, [])
+    assert get_job_posting('c').title == 'Outdated title'
+
+    assert indeed_job_backfill.backfill(start_after='b', parse_workers=0) == ('c', True, [])
+    assert get_job_posting('c').title == 'Data Analyst'
+
+
+def test_failed_objects_are_returned_and_retried(bucket):
+    bucket('a')
+    # Not valid UTF-8 once decompressed
+    S3.upload_gzip_bytes(gzip.compress(b'\xff\xfe<html>'), _BUCKET, 'b')
+    # Not a job posting page
+    S3.upload_str('<html><body>Sign in</body></html>', _BUCKET, 'c')
+    bucket('d')
+    checkpoint = mock.Mock()
+
+    def update_job_posting_from_parsed_info(job_posting_id, **kwargs):
+        if job_posting_id == 'a':
+            raise RuntimeError('Throttled')
+        return update(job_posting_id, **kwargs)
+
+    update = indeed_job_backfill.update_job_posting_from_parsed_info
+    with mock.patch.object(indeed_job_backfill, 'update_job_posting_from_parsed_info', update_job_posting_from_parsed_info):
+        last_key, done, failed_keys = indeed_job_backfill.backfill(parse_workers=0, checkpoint=checkpoint)
+
+    assert (last_key, done, sorted(failed_keys)) == ('d', True, ['a', 'b', 'c'])
+    # The checkpoint moves on, with the failed keys
+    assert sorted(checkpoint.call_args.args[1]) == ['a', 'b', 'c']
+    assert get_job_posting('d').title == 'Data Analyst'
+
+    last_key, done, failed_keys = indeed_job_backfill.backfill(start_after='d', retry_keys=failed_keys, parse_workers=0)
+
+    assert (last_key, done, sorted(failed_keys)) == ('d', True, ['b', 'c'])
+    assert get_job_posting('a').title == 'Data Analyst'
+
+
+def test_checkpoint_file_round_trip(tmp_path):
+    path = str(tmp_path / 'backfill.json')
+    assert indeed_job_backfill._load_checkpoint(path) == (None, [])
+
+    indeed_job_backfill._save_checkpoint(path, 'c', ['a'])
+
+    assert indeed_job_backfill._load_checkpoint(path) == ('c', ['a'])
@@ -0,0 +1,61 @@
+from datetime import datetime, timedelta
+from unittest import mock
+
+import pytest
+
+from bs4 import SoupStrainer
+from exceptions.exceptions import JobPostingParseError
+from parsers import indeed_job_posting
+from parsers.indeed_job_posting import parse_job_posting
+
+_PAGE = (
+    '<html><head><script>var jobKey = "1";</script></head><body>'
+    '<div class="jobsearch-ViewJobLayout"><div class="icl-Grid">'
+    '<h1 class="icl-u-xs-mb--xs jobsearch-JobInfoHeader-title">Data Analyst</h1>'
+    '<div class="jobsearch-CompanyInfoContainer"><div class="jobsearch-InlineCompanyRating icl-u-xs-mt--xs">'
+    '<div class="icl-u-lg-mr--sm">Tofino</div><div class="jobsearch-CompanyReview">4.1</div></div></div>'
+    '<div class="jobsearch-JobInfoHeader-subtitle"><div>Tofino</div><div>Vancouver, BC</div><div>Remote</div></div>'
+    '<div id="jobDescriptionText" class="jobsearch-jobDescriptionText">'
+    '<p>Analyze the data.</p><ul><li>SQL</li><li>Python &amp; pandas</li></ul></div>'
+    '<div class="jobsearch-JobMetadataFooter"><div>30+ days ago</div><div>Report job</div></div>'
+    '</div></div></body></html>'
+)
+
+_BACKENDS = [indeed_job_posting._BACKEND_FULL, indeed_job_posting._BACKEND_STRAINED, indeed_job_posting._BACKEND_LXML]
+
+
+@pytest.mark.parametrize('backend', _BACKENDS)
+def test_backends_parse_the_same_fields(backend):
+    with mock.patch.object(indeed_job_posting, '_PARSER_BACKEND', backend):
+        parsed = parse_job_posting(_PAGE, 'page.html')
+
+    assert parsed == {
+        'title': 'Data Analyst',
+        'company_name': 'Tofino',
+        'location': 'Vancouver, BC/Remote',
+        'job_description': 'Analyze the data.\nSQL\nPython & pandas',
+        'posted_datetime': (datetime.now() - timedelta(days=30)).replace(hour=0, minute=0, second=0, microsecond=0),
+    }
+
+
+def test_strained_parse_falls_back_to_the_whole_document():
+    # As if the page layout changed, the strainer no longer keeps the company
+    strainer = SoupStrainer('h1', class_=indeed_job_posting._TITLE_CLASS)
+
+    with mock.patch.object(indeed_job_posting, '_PARSER_BACKEND', indeed_job_posting._BACKEND_STRAINED), \
+            mock.patch.object(indeed_job_posting, '_STRAINER', strainer), \
+            mock.patch.object(indeed_job_posting, '_build_soup', wraps=indeed_job_posting._build_soup) as build_soup_mock:
+        parsed = parse_job_posting(_PAGE, 'page.html')
+
+    assert parsed['company_name'] == 'Tofino'
+    assert [x.args[1] for x in build_soup_mock.call_args_list] == [indeed_job_posting._BACKEND_STRAINED, indeed_job_posting._BACKEND_FULL]
+
+
+def test_full_parse_does_not_fall_back():
+    with mock.patch.object(indeed_job_posting, '_PARSER_BACKEND', indeed_job_posting._BACKEND_FULL), \
+            pytest.raises(JobPostingParseError):
+        parse_job_posting('<html><body><h1 class="jobsearch-JobInfoHeader-title">Data Analyst</h1></body></html>', 'page.html')
+
+
+def test_empty_page():
+    assert parse_job_posting('', 'page.html') is None
@@ -0,0 +1,160 @@
+from unittest import mock
+
+import pytest
+
+from exceptions.exceptions import MalFormedMessageException, RetryableException
+from functions.indeed_searcher import indeed_searcher
+
+_PAGE_URLS = [f'https://ca.indeed.com/jobs?q=data+analyst&start={x * 50}' for x in range(3)]
+
+
+def _organic(external_id: str) -> str:
+    return f'https://ca.indeed.com/rc/clk?jk={external_id}'
+
+
+def _sponsored(external_id: str) -> str:
+    return f'https://ca.indeed.com/pagead/clk?mo=r&jk={external_id}'
+
+
+@pytest.fixture
+def search():
+    """ Returns a function running the search over the given pages, and the watermark mocks """
+    with mock.patch.object(indeed_searcher, '_get_watermark') as get_watermark_mock, \
+            mock.patch.object(indeed_searcher, '_put_watermark') as put_watermark_mock, \
+            mock.patch.object(indeed_searcher, '_filter_existing_urls', side_effect=lambda urls: urls), \
+            mock.patch.object(indeed_searcher, '_crawl_search_page') as crawl_search_page_mock:
+
+        def run(pages: list, watermark: list[str] = ()):
+            get_watermark_mock.return_value = list(watermark)
+            crawl_search_page_mock.side_effect = pages
+            return indeed_searcher._search(_PAGE_URLS[:len(pages)])
+
+        yield run, put_watermark_mock, crawl_search_page_mock
+
+
+def test_search_stops_at_the_page_seen_by_the_previous_run(search):
+    run, put_watermark_mock, crawl_search_page_mock = search
+
+    new_urls = run([
+        [_organic('c'), _organic('b')],
+        [_organic('a'), _organic('z')],
+        [_organic('y')],
+    ], watermark=['a', 'z'])
+
+    assert new_urls == [_organic('c'), _organic('b')]
+    assert crawl_search_page_mock.call_count == 2
+    put_watermark_mock.assert_called_once_with(_PAGE_URLS[0], ['c', 'b', 'a', 'z'])
+
+
+def test_search_does_not_stop_at_a_page_partly_seen(search):
+    run, _, crawl_search_page_mock = search
+
+    new_urls = run([
+        [_organic('c'), _organic('a')],
+        [_organic('b')],
+        [_organic('z')],
+    ], watermark=['a', 'z'])
+
+    assert new_urls == [_organic('c'), _organic('b')]
+    assert crawl_search_page_mock.call_count == 3
+
+
+def test_sponsored_results_do_not_stop_the_search(search):
+    run, put_watermark_mock, crawl_search_page_mock = search
+
+    new_urls = run([
+        [_sponsored('a'), _organic('c')],
+        [_organic('b')],
+    ], watermark=['a'])
+
+    assert new_urls == [_organic('c'), _organic('b')]
+    assert crawl_search_page_mock.call_count == 2
+    # Only the organic results go to the watermark
+    put_watermark_mock.assert_called_once_with(_PAGE_URLS[0], ['c', 'b', 'a'])
+
+
+def test_watermark_is_kept_when_a_page_failed(search):
+    run, put_watermark_mock, _ = search
+
+    new_urls = run([
+        [_organic('c')],
+        RuntimeError('crawl failed'),
+    ], watermark=['a'])
+
+    assert new_urls == [_organic('c')]
+    put_watermark_mock.assert_not_called()
+
+
+def test_search_fails_when_the_first_page_failed(search):
+    run, put_watermark_mock, _ = search
+
+    assert run([RuntimeError('crawl failed')]) is None
+    put_watermark_mock.assert_not_called()
+
+
+def test_event_with_a_search_page_url():
+    assert indeed_searcher._parse_event({'url': _PAGE_URLS[0]}) == [[_PAGE_URLS[0]]]
+
+
+def test_event_with_queries():
+    search_urls = indeed_searcher._parse_event({'queries': [{'q': 'data analyst', 'l': 'Vancouver, BC'}, {'q': 'data scientist'}], 'pages': 2})
+
+    assert search_urls == [
+        [
+            'https://ca.indeed.com/jobs?q=data+analyst&l=Vancouver%2C+BC&sort=date&limit=50',
+            'https://ca.indeed.com/jobs?q=data+analyst&l=Vancouver%2C+BC&sort=date&limit=50&start=50',
+        ],
+        [
+            'https://ca.indeed.com/jobs?q=data+scientist&sort=date&limit=50',
+            'https://ca.indeed.com/jobs?q=data+scientist&sort=date&limit=50&start=50',
+        ],
+    ]
+
+
+@pytest.mark.parametrize('event', [
+    {},
+    {'queries': []},
+    {'queries': 'data analyst'},
+    {'queries': [{'l': 'Vancouver, BC'}]},
+    {'queries': [{'q': 'data analyst'}], 'pages': 0},
+    {'queries': [{'q': 'data analyst'}], 'pages': indeed_searcher._MAX_PAGES + 1},
+    {'queries': [{'q': 'data analyst'}], 'pages': '2'},
+])
+def test_malformed_event(event):
+    with pytest.raises(MalFormedMessageException):
+        indeed_searcher._parse_event(event)
+
+
+def test_queries_are_searched_and_deduplicated():
+    results = {
+        'data+analyst': [_organic('a'), _organic('b'), 'https://ca.indeed.com/viewjob?from=x'],
+        # The same job postings behind other tracking parameters
+        'data+scientist': [_organic('b') + '&tk=1', _sponsored('a'), _organic('c'), 'https://ca.indeed.com/viewjob?from=x'],
+    }
+
+    def search(page_urls, context=None):
+        assert len(page_urls) == 2
+        return results[page_urls[0].split('q=')[1].split('&')[0]]
+
+    with mock.patch.object(indeed_searcher, '_search', side_effect=search) as search_mock:
+        result = indeed_searcher.lambda_handler({'queries': [{'q': 'data analyst'}, {'q': 'data scientist'}], 'pages': 2}, None)
+
+    assert search_mock.call_count == 2
+    assert result == {'job_postings': [
+        {'url': _organic('a')},
+        {'url': _organic('b')},
+        {'url': 'https://ca.indeed.com/viewjob?from=x'},
+        {'url': _organic('c')},
+    ]}
+
+
+def test_failed_query_does_not_fail_the_others():
+    with mock.patch.object(indeed_searcher, '_search', side_effect=lambda page_urls, context=None: None if 'analyst' in page_urls[0] else [_organic('c')]):
+        result = indeed_searcher.lambda_handler({'queries': [{'q': 'data analyst'}, {'q': 'data scientist'}]}, None)
+
+    assert result == {'job_postings': [{'url': _organic('c')}]}
+
+
+def test_every_query_failed():
+    with mock.patch.object(indeed_searcher, '_search', return_value=None), pytest.raises(RetryableException):
+        indeed_searcher.lambda_handler({'queries': [{'q': 'data analyst'}, {'q': 'data scientist'}]}, None)
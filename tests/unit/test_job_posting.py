@@ -0,0 +1,188 @@
+import os
+from datetime import datetime
+from unittest import mock
+
+import pytest
+
+from aws.client_factory import get_client
+from botocore.exceptions import ClientError
+from models import job_posting
+from models.job_posting import (JobPosting, JobPostingWriter,
+                                compute_content_hash, compute_parsed_hash,
+                                create_job_posting, get_job_posting,
+                                get_job_posting_by_origin_url,
+                                list_job_postings,
+                                update_job_posting_from_parsed_info)
+
+_LARGE_DESCRIPTION = 'Analyze the data. ' * 1000
+
+
+def _get_item(job_posting_id: str) -> dict:
+    return get_client('dynamodb').get_item(TableName=os.environ['JOB_POSTING_TABLE'], Key={'Id': {'S': job_posting_id}})['Item']
+
+
+def test_writer_puts_in_batches(job_posting_table):
+    with mock.patch.object(job_posting.DynamoDB, 'batch_write_item', wraps=job_posting.DynamoDB.batch_write_item) as batch_write_item_mock:
+        with JobPostingWriter(batch_size=10) as writer:
+            for i in range(25):
+                writer.create(id=str(i), external_id=f'external-{i}', title='Data Analyst')
+
+    assert [len(x.kwargs['put_items']) for x in batch_write_item_mock.call_args_list] == [10, 10, 5]
+    assert len(list_job_postings([str(x) for x in range(25)])) == 25
+
+
+def test_writer_discards_the_buffer_on_error(job_posting_table):
+    with pytest.raises(RuntimeError):
+        with JobPostingWriter() as writer:
+            writer.create(id='1', title='Data Analyst')
+            raise RuntimeError
+
+    assert get_job_posting('1') is None
+
+
+def test_unknown_field():
+    with pytest.raises(TypeError):
+        JobPosting(salary='100k')
+
+
+def test_partial_load_fetches_the_other_fields_on_first_access(job_posting_table):
+    create_job_posting(id='1', external_id='e1', title='Data Analyst', company_name='Tofino', origin_url='https://ca.indeed.com/rc/clk?jk=e1')
+
+    with mock.patch.object(job_posting.DynamoDB, 'get_item', wraps=job_posting.DynamoDB.get_item) as get_item_mock:
+        partial = get_job_posting('1', fields=['title'])
+        assert partial.title == 'Data Analyst'
+        assert get_item_mock.call_count == 1
+
+        assert partial.company_name == 'Tofino'
+        assert partial.external_id == 'e1'
+        # The missing fields are loaded once, together
+        assert get_item_mock.call_count == 2
+
+
+def test_lookup_by_origin_url_reads_the_index_projection(job_posting_table):
+    create_job_posting(id='1', external_id='e1', title='Data Analyst', origin_url='https://ca.indeed.com/rc/clk?jk=e1', uploaded_datetime=datetime(2021, 1, 1))
+
+    with mock.patch.object(job_posting.DynamoDB, 'get_item') as get_item_mock:
+        found = get_job_posting_by_origin_url('https://ca.indeed.com/rc/clk?jk=e1')
+        assert (found.id, found.external_id, found.uploaded_datetime) == ('1', 'e1', datetime(2021, 1, 1))
+
+    get_item_mock.assert_not_called()
+
+
+def test_large_description_is_kept_in_the_item_by_default(job_posting_table):
+    create_job_posting(id='1', job_description=_LARGE_DESCRIPTION)
+
+    assert _get_item('1')['JobDescription'] == {'S': _LARGE_DESCRIPTION}
+
+
+@mock.patch.object(job_posting, '_OFFLOAD', job_posting._OFFLOAD_COMPRESS)
+def test_large_description_is_compressed(job_posting_table):
+    create_job_posting(id='1', job_description=_LARGE_DESCRIPTION)
+
+    item = _get_item('1')
+    assert 'JobDescription' not in item
+    assert 'JobDescriptionCompressed' in item
+    assert get_job_posting('1').job_description == _LARGE_DESCRIPTION
+
+
+@mock.patch.object(job_posting, '_OFFLOAD', job_posting._OFFLOAD_COMPRESS)
+def test_small_description_is_kept_in_the_item(job_posting_table):
+    create_job_posting(id='1', job_description='Analyze the data.')
+
+    assert _get_item('1')['JobDescription'] == {'S': 'Analyze the data.'}
+    assert get_job_posting('1').job_description == 'Analyze the data.'
+
+
+def test_large_description_is_offloaded_to_s3(job_posting_table):
+    get_client('s3').create_bucket(Bucket='test-job-description', CreateBucketConfiguration={'LocationConstraint': 'us-west-2'})
+
+    with mock.patch.object(job_posting, '_OFFLOAD', job_posting._OFFLOAD_S3), \
+            mock.patch.object(job_posting, '_OFFLOAD_BUCKET', 'test-job-description'):
+        create_job_posting(id='1', job_description=_LARGE_DESCRIPTION)
+
+        assert _get_item('1')['JobDescriptionS3Key'] == {'S': '1/JobDescription'}
+        assert get_job_posting('1').job_description == _LARGE_DESCRIPTION
+
+
+def test_skipped_update_does_not_upload_to_s3(job_posting_table):
+    get_client('s3').create_bucket(Bucket='test-job-description', CreateBucketConfiguration={'LocationConstraint': 'us-west-2'})
+    parsed = {**_PARSED, 'job_description': _LARGE_DESCRIPTION}
+    parsed_hash = compute_parsed_hash(parsed)
+
+    with mock.patch.object(job_posting, '_OFFLOAD', job_posting._OFFLOAD_S3), \
+            mock.patch.object(job_posting, '_OFFLOAD_BUCKET', 'test-job-description'):
+        create_job_posting(id='1', external_id='e1')
+        assert update_job_posting_from_parsed_info('1', skip_unchanged=True, parsed_hash=parsed_hash, **parsed)
+
+        with mock.patch.object(job_posting.S3, 'upload_gzip_bytes') as upload_mock:
+            assert not update_job_posting_from_parsed_info('1', skip_unchanged=True, parsed_hash=parsed_hash, **parsed)
+            with pytest.raises(ClientError):
+                update_job_posting_from_parsed_info('2', job_description=_LARGE_DESCRIPTION)
+
+        upload_mock.assert_not_called()
+        assert get_job_posting('1').job_description == _LARGE_DESCRIPTION
+
+
+@mock.patch.object(job_posting, '_OFFLOAD', job_posting._OFFLOAD_COMPRESS)
+def test_updated_description_replaces_the_offloaded_one(job_posting_table):
+    create_job_posting(id='1', job_description=_LARGE_DESCRIPTION)
+
+    update_job_posting_from_parsed_info('1', job_description='Analyze the data.')
+
+    item = _get_item('1')
+    assert 'JobDescriptionCompressed' not in item
+    assert get_job_posting('1').job_description == 'Analyze the data.'
+
+
+_PARSED = {'title': 'Data Analyst', 'company_name': 'Tofino', 'location': 'Vancouver, BC', 'job_description': 'Analyze the data.'}
+
+
+def test_content_hash_ignores_volatile_page_parts():
+    page = '<html><head><script>var nonce = "1";</script></head><body><div class="job">Data Analyst</div></body></html>'
+    recrawled = """<html>
+      <head><script>var nonce = "2";</script><style>.job { color: red; }</style></head>
+      <!-- rendered in 12ms -->
+      <body>
+        <div class="job" data-tracking-id="abc">  Data   Analyst </div>
+      </body>
+    </html>"""
+
+    assert compute_content_hash(page) == compute_content_hash(recrawled)
+
+
+def test_content_hash_changes_with_the_text():
+    assert compute_content_hash('<div>Data Analyst</div>') != compute_content_hash('<div>Data Scientist</div>')
+    assert compute_content_hash('<div>Data Analyst</div>') != compute_content_hash('<div>DataAnalyst</div>')
+
+
+def test_parsed_hash_covers_the_written_fields():
+    assert compute_parsed_hash(_PARSED) == compute_parsed_hash({**_PARSED, 'posted_datetime': datetime(2021, 1, 1)})
+    # Cleansed like the description written to the record
+    assert compute_parsed_hash(_PARSED) == compute_parsed_hash({**_PARSED, 'job_description': '\ufeffAnalyze the data.'})
+
+    for field in ('title', 'company_name', 'location', 'job_description'):
+        assert compute_parsed_hash(_PARSED) != compute_parsed_hash({**_PARSED, field: 'changed'})
+
+
+def test_parsed_hash_separates_the_fields():
+    assert compute_parsed_hash({**_PARSED, 'title': 'Data', 'company_name': 'Analyst'}) != \
+        compute_parsed_hash({**_PARSED, 'title': 'Data Analyst', 'company_name': ''})
+
+
+def test_unchanged_parsed_info_is_not_written(job_posting_table):
+    create_job_posting(id='1', external_id='e1')
+    parsed_hash = compute_parsed_hash(_PARSED)
+
+    assert update_job_posting_from_parsed_info('1', skip_unchanged=True, parsed_hash=parsed_hash, **_PARSED)
+    updated_datetime = get_job_posting('1').updated_datetime
+
+    with mock.patch.object(job_posting.DynamoDB, 'get_item', wraps=job_posting.DynamoDB.get_item) as get_item_mock:
+        assert not update_job_posting_from_parsed_info('1', skip_unchanged=True, parsed_hash=parsed_hash, **_PARSED)
+    assert get_job_posting('1').updated_datetime == updated_datetime
+    # Only the hash is read to tell an unchanged record from a missing one
+    assert get_item_mock.call_args.kwargs['projection_expression'] == 'ParsedHash'
+
+
+def test_skip_unchanged_raises_for_a_missing_record(job_posting_table):
+    with pytest.raises(ClientError):
+        update_job_posting_from_parsed_info('1', skip_unchanged=True, parsed_hash=compute_parsed_hash(_PARSED), **_PARSED)
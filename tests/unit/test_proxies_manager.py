@@ -0,0 +1,183 @@
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from unittest import mock
+
+import pytest
+
+from crawler import proxies_manager
+from crawler.proxies_manager import COOLDOWN_BASE, COOLDOWN_MAX, ProxiesManager
+from exceptions import RetryableException
+from models.crawler_proxy import CrawlerProxy
+
+_URL = 'https://ca.indeed.com/viewjob?jk=1'
+_PAGE = '<html><body><h1>Data Analyst</h1></body></html>'
+
+
+def _proxy(proxy_id: str, region: str) -> CrawlerProxy:
+    return CrawlerProxy({
+        'Id': {'S': proxy_id},
+        'Region': {'S': region},
+        'Arn': {'S': f'arn:aws:lambda:{region}:000000000000:function:{proxy_id}'},
+        'DeactivatedEpochSecond': {'N': '0'},
+        'DeactivatedCount': {'N': '0'},
+    })
+
+
+def _ok(content: str = _PAGE) -> str:
+    return json.dumps({'url': _URL, 'statusCode': 200, 'content': content})
+
+
+@pytest.fixture
+def proxies():
+    """ Two proxies in different regions, with the module state and the AWS calls mocked """
+    pool = [_proxy('proxy-west', 'us-west-2'), _proxy('proxy-east', 'us-east-1')]
+
+    with mock.patch.object(proxies_manager, '_proxy_pool', []), \
+            mock.patch.object(proxies_manager, '_proxy_pool_expires_at', datetime.min), \
+            mock.patch.object(proxies_manager, '_proxy_stats', {}), \
+            mock.patch.object(proxies_manager, 'list_active_crawler_proxy', return_value=pool), \
+            mock.patch.object(proxies_manager, 'deactivate_crawler_proxy') as deactivate_mock, \
+            mock.patch.object(proxies_manager, 'record_crawler_proxy_stats'), \
+            mock.patch.object(proxies_manager, 'RateLimiter'), \
+            mock.patch.object(proxies_manager, 'Lambda') as lambda_mock, \
+            mock.patch.object(proxies_manager.random, 'choices', side_effect=lambda population, weights: population[:1]):
+        yield lambda_mock, deactivate_mock
+
+
+def _invoke_by_region(responses: dict):
+    def invoke(region, arn, payload):
+        response = responses[region]
+        return response() if callable(response) else response
+    return invoke
+
+
+def test_cooldown_doubles_up_to_the_max():
+    assert ProxiesManager.get_cooldown(1) == COOLDOWN_BASE
+    assert ProxiesManager.get_cooldown(2) == COOLDOWN_BASE * 2
+    assert ProxiesManager.get_cooldown(3) == COOLDOWN_BASE * 4
+    assert ProxiesManager.get_cooldown(1000) == COOLDOWN_MAX
+
+
+def test_failover_to_a_proxy_in_another_region(proxies):
+    lambda_mock, deactivate_mock = proxies
+    lambda_mock.invoke.side_effect = _invoke_by_region({
+        'us-west-2': json.dumps({'url': _URL, 'statusCode': 503}),
+        'us-east-1': _ok(),
+    })
+
+    with mock.patch.object(proxies_manager, 'HEDGE_AFTER_SECONDS', 0):
+        response = ProxiesManager().crawl(_URL)
+
+    assert response.content == _PAGE
+    assert [x.args[0] for x in lambda_mock.invoke.call_args_list] == ['us-west-2', 'us-east-1']
+    # Benched for COOLDOWN_BASE after its first failure
+    assert deactivate_mock.call_args[0][0] == 'proxy-west'
+    assert timedelta(minutes=14) < deactivate_mock.call_args[0][1] - datetime.now() <= COOLDOWN_BASE
+
+
+def test_failover_raises_when_every_proxy_failed(proxies):
+    lambda_mock, _ = proxies
+    lambda_mock.invoke.side_effect = _invoke_by_region({
+        'us-west-2': _ok('<script src="https://www.hcaptcha.com/1/api.js"></script>'),
+        'us-east-1': json.dumps({'url': _URL, 'statusCode': 200, 'content': ''}),
+    })
+
+    with mock.patch.object(proxies_manager, 'HEDGE_AFTER_SECONDS', 0):
+        with pytest.raises(RetryableException):
+            ProxiesManager().crawl(_URL)
+
+    assert lambda_mock.invoke.call_count == 2
+
+
+def test_slow_proxy_is_hedged_in_another_region(proxies):
+    lambda_mock, deactivate_mock = proxies
+    slow_answered = threading.Event()
+
+    def slow():
+        time.sleep(0.5)
+        slow_answered.set()
+        return json.dumps({'url': _URL, 'statusCode': 503})
+
+    lambda_mock.invoke.side_effect = _invoke_by_region({'us-west-2': slow, 'us-east-1': _ok()})
+
+    with mock.patch.object(proxies_manager, 'HEDGE_AFTER_SECONDS', 0.05):
+        start = time.monotonic()
+        response = ProxiesManager().crawl(_URL)
+
+        assert time.monotonic() - start < 0.5
+        assert response.content == _PAGE
+
+        # The abandoned invoke is left to finish, its response is discarded
+        assert slow_answered.wait(timeout=5)
+        time.sleep(0.1)
+
+    deactivate_mock.assert_not_called()
+    # Counted against the slow proxy when the hedge fired, its discarded response is not counted
+    assert proxies_manager._proxy_stats['proxy-west'].pending_outcome_counts == {'Hedged': 1}
+    assert proxies_manager._proxy_stats['proxy-west'].failure_count == 1
+
+
+def test_fast_proxy_is_not_hedged(proxies):
+    lambda_mock, _ = proxies
+    lambda_mock.invoke.side_effect = _invoke_by_region({'us-west-2': _ok(), 'us-east-1': _ok()})
+
+    with mock.patch.object(proxies_manager, 'HEDGE_AFTER_SECONDS', 1):
+        ProxiesManager().crawl(_URL)
+
+    assert lambda_mock.invoke.call_count == 1
+
+
+def test_rate_limit_wait_does_not_trigger_the_hedge(proxies):
+    lambda_mock, _ = proxies
+    lambda_mock.invoke.side_effect = _invoke_by_region({'us-west-2': _ok(), 'us-east-1': _ok()})
+    proxies_manager.RateLimiter.acquire_crawl.side_effect = lambda *args: time.sleep(0.2)
+
+    with mock.patch.object(proxies_manager, 'HEDGE_AFTER_SECONDS', 0.1):
+        ProxiesManager().crawl(_URL)
+
+    assert lambda_mock.invoke.call_count == 1
+
+
+def test_queued_invoke_does_not_trigger_the_hedge(proxies):
+    lambda_mock, _ = proxies
+    lambda_mock.invoke.side_effect = _invoke_by_region({'us-west-2': _ok(), 'us-east-1': _ok()})
+
+    # The only worker is busy with an abandoned invoke for longer than HEDGE_AFTER_SECONDS
+    with ThreadPoolExecutor(max_workers=1) as executor, \
+            mock.patch.object(proxies_manager, '_hedge_executor', executor), \
+            mock.patch.object(proxies_manager, 'HEDGE_AFTER_SECONDS', 0.1):
+        executor.submit(time.sleep, 0.3)
+        ProxiesManager().crawl(_URL)
+
+    assert lambda_mock.invoke.call_count == 1
+    assert 'Hedged' not in proxies_manager._proxy_stats['proxy-west'].pending_outcome_counts
+
+
+def test_flush_sends_the_outcomes_since_the_last_flush(proxies):
+    ProxiesManager._record_outcome('proxy-west', 'Success', 0.5)
+    ProxiesManager._record_outcome('proxy-west', 'Captcha', 0.25)
+    ProxiesManager._record_outcome('proxy-east', 'Success', 1)
+
+    ProxiesManager.flush_stats(force=True)
+
+    record_mock = proxies_manager.record_crawler_proxy_stats
+    assert sorted(x.args + (x.kwargs['reset_failure_streak'],) for x in record_mock.call_args_list) == [
+        ('proxy-east', {'Success': 1}, 1000, True),
+        ('proxy-west', {'Success': 1, 'Captcha': 1}, 750, False),
+    ]
+
+    # Nothing pending since, and the counts kept for the proxy weights are not reset
+    record_mock.reset_mock()
+    ProxiesManager.flush_stats(force=True)
+    record_mock.assert_not_called()
+    assert proxies_manager._proxy_stats['proxy-west'].success_count == 1
+
+
+def test_failed_flush_does_not_raise(proxies):
+    ProxiesManager._record_outcome('proxy-west', 'Success', 0.5)
+    proxies_manager.record_crawler_proxy_stats.side_effect = RuntimeError
+
+    ProxiesManager.flush_stats(force=True)
@@ -0,0 +1,71 @@
+import time
+from unittest import mock
+
+import pytest
+
+from crawler import rate_limiter
+from crawler.rate_limiter import RateLimiter
+from exceptions import RetryableException
+from models.crawl_rate_limit import acquire_crawl_token
+
+
+@pytest.fixture(autouse=True)
+def exhausted_seconds():
+    with mock.patch.dict(rate_limiter._exhausted_seconds, clear=True):
+        yield
+
+
+def test_tokens_are_counted_per_key_and_second(crawl_rate_limit_table):
+    assert acquire_crawl_token('domain#ca.indeed.com', 1600000000, 2)
+    assert acquire_crawl_token('domain#ca.indeed.com', 1600000000, 2)
+    assert not acquire_crawl_token('domain#ca.indeed.com', 1600000000, 2)
+
+    assert acquire_crawl_token('domain#ca.indeed.com', 1600000001, 2)
+    assert acquire_crawl_token('region#us-west-2', 1600000000, 2)
+
+
+def test_acquire_waits_for_the_next_second():
+    with mock.patch('crawler.rate_limiter.acquire_crawl_token', side_effect=[False, True]) as acquire_crawl_token_mock, \
+            mock.patch.object(rate_limiter, 'time') as time_mock:
+        time_mock.time.side_effect = [1600000000.5, 1600000001.1]
+        RateLimiter.acquire('domain#ca.indeed.com', 2)
+
+    assert [x.args[1] for x in acquire_crawl_token_mock.call_args_list] == [1600000000, 1600000001]
+    # Until the next second, plus the jitter
+    assert 0.5 <= time_mock.sleep.call_args[0][0] <= 0.7
+
+
+def test_refused_second_is_not_written_again():
+    # Another thread of the container was refused in this second already
+    rate_limiter._exhausted_seconds['domain#ca.indeed.com'] = 1600000000
+
+    with mock.patch('crawler.rate_limiter.acquire_crawl_token', return_value=True) as acquire_crawl_token_mock, \
+            mock.patch.object(rate_limiter, 'time') as time_mock:
+        time_mock.time.side_effect = [1600000000.2, 1600000001.1]
+        RateLimiter.acquire('domain#ca.indeed.com', 2)
+
+    acquire_crawl_token_mock.assert_called_once_with('domain#ca.indeed.com', 1600000001, 2)
+    time_mock.sleep.assert_called_once()
+
+
+def test_acquire_gives_up_at_the_deadline():
+    with mock.patch('crawler.rate_limiter.acquire_crawl_token', return_value=False), \
+            mock.patch('crawler.rate_limiter.time.sleep') as sleep_mock:
+        with pytest.raises(RetryableException):
+            RateLimiter.acquire('domain#ca.indeed.com', 2, deadline=time.monotonic())
+
+    sleep_mock.assert_not_called()
+
+
+def test_acquire_validates_its_arguments():
+    with pytest.raises(ValueError):
+        RateLimiter.acquire('', 2)
+    with pytest.raises(ValueError):
+        RateLimiter.acquire('domain#ca.indeed.com', 0)
+
+
+def test_domain_token_is_taken_before_the_region_token():
+    with mock.patch.object(RateLimiter, 'acquire') as acquire_mock:
+        RateLimiter.acquire_crawl('ca.indeed.com', 'us-west-2')
+
+    assert [x.args[0] for x in acquire_mock.call_args_list] == ['domain#ca.indeed.com', 'region#us-west-2']
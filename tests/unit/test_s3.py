@@ -0,0 +1,44 @@
+import gzip
+
+import pytest
+
+from aws.client_factory import get_client
+from aws.s3 import S3
+
+_BUCKET = 'test-indeed-job-posting'
+_PAGE = '<html><body><h1>Analyste de données</h1></body></html>'
+
+
+@pytest.fixture
+def bucket(aws):
+    get_client('s3').create_bucket(Bucket=_BUCKET, CreateBucketConfiguration={'LocationConstraint': 'us-west-2'})
+
+
+def test_upload_is_compressed_and_read_back(bucket):
+    S3.upload_str(_PAGE, _BUCKET, 'a')
+
+    response = get_client('s3').get_object(Bucket=_BUCKET, Key='a')
+    assert response['ContentEncoding'] == 'gzip'
+    assert response['ContentType'] == 'text/html; charset=utf-8'
+    assert gzip.decompress(response['Body'].read()).decode('utf-8') == _PAGE
+    assert S3.download_file_str(_BUCKET, 'a') == _PAGE
+
+
+def test_uncompressed_upload_is_read_back(bucket):
+    S3.upload_str(_PAGE, _BUCKET, 'a', compress=False)
+
+    assert 'ContentEncoding' not in get_client('s3').get_object(Bucket=_BUCKET, Key='a')
+    assert S3.download_file_str(_BUCKET, 'a') == _PAGE
+
+
+def test_legacy_object_is_read_as_is(bucket):
+    # Uploaded before compression, with no ContentEncoding nor ContentType
+    get_client('s3').put_object(Bucket=_BUCKET, Key='a', Body=_PAGE.encode('utf-8'))
+
+    assert S3.download_file_str(_BUCKET, 'a') == _PAGE
+
+
+def test_gzip_object_without_content_encoding_is_decompressed(bucket):
+    get_client('s3').put_object(Bucket=_BUCKET, Key='a', Body=gzip.compress(_PAGE.encode('utf-8')))
+
+    assert S3.download_file_str(_BUCKET, 'a') == _PAGE
@@ -0,0 +1,22 @@
+from models.search_watermark import (MAX_WATERMARK_EXTERNAL_IDS,
+                                     get_search_watermark,
+                                     put_search_watermark)
+
+
+def test_missing_watermark(search_watermark_table):
+    assert get_search_watermark('q=data+analyst&l=') == []
+
+
+def test_put_and_get_watermark(search_watermark_table):
+    put_search_watermark('q=data+analyst&l=', ['c', 'b', 'a'])
+
+    assert get_search_watermark('q=data+analyst&l=') == ['c', 'b', 'a']
+    assert get_search_watermark('q=data+scientist&l=') == []
+
+
+def test_watermark_keeps_the_most_recent_ids(search_watermark_table):
+    external_ids = [str(x) for x in range(MAX_WATERMARK_EXTERNAL_IDS + 10)]
+
+    put_search_watermark('q=data+analyst&l=', external_ids)
+
+    assert get_search_watermark('q=data+analyst&l=') == external_ids[:MAX_WATERMARK_EXTERNAL_IDS]